@@ -0,0 +1,413 @@
+"""Les agents de Super Prof, déclarés une seule fois, et le moteur qui les exécute.
+
+Chaque agent est une fiche `Agent` : prompt système, requête, modèle, budget
+de tokens, politique de cache, streaming. Un seul moteur (`Engine.run` /
+`run_async` / `run_many`) applique à tous :
+
+- la fenêtre d'historique (context_window) et les extraits du PDF (pdf_index) ;
+- le cache de contexte Gemini pour les gros préfixes plan + PDF (context_cache) ;
+- le cache de réponses exact (response_cache) ou sémantique (semantic_cache) ;
+- l'airbag (retries + limiteur par clé) et les métriques par agent ;
+- la concurrence : pool de fanout pour `run_many`, boucle d'async_runtime pour `run_async`.
+
+Une optimisation ajoutée au moteur profite donc à tous les agents, et le
+benchmark mesure le même chemin que l'interface.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+import airbag
+import async_runtime
+import context_cache
+import metrics
+import model_registry
+import response_cache
+from context_window import BUDGETS, open_chat, truncate_to_budget, window
+from conversation import as_history, forget_extras
+from fanout import run_parallel
+from model_registry import MODELE_PAR_DEFAUT
+# pdf_index et semantic_cache (NumPy) sont importés au premier PDF / à la première question dédoublonnée
+
+EXACT = "exact"            # même agent + même historique + même requête -> même réponse
+SEMANTIQUE = "semantique"  # questions quasi identiques sur le même plan (opt-in à l'appel : dedup=True)
+
+MSG_SURCHARGE = "⚠️ Le système est surchargé. Attends 1 minute et réessaie."
+
+# Les réponses des spécialistes restent dans la conversation, signées : "### <signature>\n<texte>"
+SIGNATURES = {
+    "quiz": "😈 **EXAMINATEUR**",
+    "coach": "📣 **COACH**",
+    "fiche": "📝 **SCRIBE**",
+    "revue": "🧩 **REVUE COMPLÈTE**",
+}
+_ENTETES = tuple(f"### {s}\n" for s in SIGNATURES.values())
+
+
+def signed(kind, text=""):
+    return f"### {SIGNATURES[kind]}\n{text}"
+
+
+def specialist_turn(turn):
+    """Tour écrit par un spécialiste (quiz, conseil, fiche, revue), pas par l'étudiant ni le Professeur."""
+    parts = turn.get("parts") or [""]
+    return str(parts[0]).startswith(_ENTETES)
+
+
+@dataclass(frozen=True)
+class Agent:
+    name: str                        # métriques, clés de cache, fenêtre d'historique
+    system: str                      # prompt système (gabarit str.format, ex: {plan})
+    request: str                     # message envoyé à chaque appel (gabarit)
+    model: str = MODELE_PAR_DEFAUT
+    budget: Optional[int] = None     # tokens : fenêtre d'historique, ou variables de `truncate`
+    truncate: tuple = ()             # variables du gabarit coupées au budget (ex: le PDF du Manager)
+    history: bool = True             # False : appel simple (generate_content), sans chat
+    session: bool = False            # True : réutilise la ChatSession vivante de la Conversation
+    cache: Optional[str] = None      # EXACT, SEMANTIQUE ou None
+    stream: bool = False             # réponse rendue au fil de l'eau par défaut
+    extraits: int = 0                # morceaux du PDF glissés devant la requête (0 = aucun)
+    context_cache: bool = False      # plan + PDF servis par le cache de contexte s'ils sont assez gros
+
+
+# --- LE REGISTRE ---
+AGENTS = {a.name: a for a in (
+    # 1. LE MANAGER : un plan par (objectif, PDF), jamais régénéré
+    Agent("manager",
+          system="Tu es le Manager Pédagogique. Analyse la demande et fais un plan d'apprentissage numéroté "
+                 "et structuré. Reste synthétique : ne donne pas le cours, fais le sommaire.",
+          request="Objectif : {objectif}\n\nContexte PDF : {pdf}",
+          budget=BUDGETS["manager_pdf"], truncate=("pdf",), history=False, cache=EXACT),
+    # 2. LE PROFESSEUR : la conversation elle-même
+    Agent("professeur",
+          system="Tu es un Professeur Expert. Ton plan à suivre est : {plan}. "
+                 "Sois pédagogue, clair, et procède étape par étape.",
+          request="{question}",
+          budget=BUDGETS["professeur"], session=True, cache=SEMANTIQUE, stream=True, extraits=4,
+          context_cache=True),
+    # 3. LE SCRIBE (fusion d'un sous-dossier, ou fiche de révision)
+    Agent("scribe-fusion",
+          system="Tu es le Scribe. Fais un résumé dense de ce sous-module pour le dossier parent.",
+          request="Fais le résumé demandé.",
+          budget=BUDGETS["scribe"], cache=EXACT),
+    Agent("scribe-fiche",
+          system="Tu es le Scribe. Crée une Fiche de Révision propre (Markdown) avec définitions et points clés.",
+          request="Fais le résumé demandé.",
+          budget=BUDGETS["scribe"], cache=EXACT),
+    # 4. L'EXAMINATEUR : extraits du PDF choisis d'après les derniers tours
+    Agent("examinateur",
+          system="Tu es l'Examinateur. Pose 3 questions (QCM ou pièges) sur ce qui vient d'être dit pour "
+                 "vérifier la compréhension. Ne donne pas la réponse tout de suite.",
+          request="Teste-moi maintenant.",
+          budget=BUDGETS["examinateur"], cache=EXACT, stream=True, extraits=3),
+    # 5. LE COACH : pas de cache, un conseil différent à chaque fois
+    Agent("coach",
+          system="Tu es le Coach Mental. Analyse la conversation. Donne un conseil méthodologique "
+                 "(ex: Pomodoro) et une phrase de motivation choc. Sois bref.",
+          request="J'ai besoin de motivation.",
+          budget=BUDGETS["coach"], stream=True),
+)}
+
+
+# --- ENVOI (airbag + métriques) ---
+def _send(model, chat, prompt, stream):
+    if chat is not None:
+        return chat.send_message(prompt, stream=stream)
+    return model.generate_content(prompt, stream=stream)
+
+
+def _limiter(api_key):
+    return airbag.get_limiter(api_key) if api_key else None
+
+
+def stream_chunks(response, call=None):
+    """Transforme une réponse Gemini en streaming en morceaux de texte."""
+    for chunk in response:
+        if call is not None:
+            call.usage(chunk)
+        try:
+            text = chunk.text
+        except ValueError:
+            # Morceau sans texte (ex: fin de flux ou filtre de sécurité)
+            continue
+        if text:
+            if call is not None:
+                metrics.first_chunk(call)
+            yield text
+
+
+def generate(agent, api_key, model, chat, prompt):
+    with metrics.track("gemini", agent) as call:
+        response = airbag.call_with_retry(lambda: _send(model, chat, prompt, False),
+                                          limiter=_limiter(api_key), on_retry=call.on_retry)
+        call.usage(response)
+        return response.text
+
+
+def generate_stream(agent, api_key, model, chat, prompt):
+    # L'airbag ne se déclenche qu'avant le premier morceau : rien n'a encore été affiché
+    with metrics.track("gemini", agent) as call:  # mesuré jusqu'au dernier morceau
+        response = airbag.call_with_retry(lambda: _send(model, chat, prompt, True),
+                                          limiter=_limiter(api_key), on_retry=call.on_retry)
+        yield from stream_chunks(response, call)
+
+
+async def generate_async(agent, api_key, model, chat, prompt):
+    async def send():
+        async with async_runtime.limit():
+            if chat is not None:
+                return await chat.send_message_async(prompt)
+            return await model.generate_content_async(prompt)
+
+    with metrics.track("gemini", agent) as call:
+        response = await airbag.call_with_retry_async(send, limiter=_limiter(api_key), on_retry=call.on_retry)
+        call.usage(response)
+        return response.text
+
+
+async def generate_stream_async(agent, api_key, model, chat, prompt):
+    """Générateur asynchrone de morceaux de texte (le créneau de concurrence est tenu jusqu'au bout)."""
+    async def send():
+        if chat is not None:
+            return await chat.send_message_async(prompt, stream=True)
+        return await model.generate_content_async(prompt, stream=True)
+
+    async with async_runtime.limit():
+        with metrics.track("gemini", agent) as call:
+            response = await airbag.call_with_retry_async(send, limiter=_limiter(api_key), on_retry=call.on_retry)
+            async for chunk in response:
+                call.usage(chunk)
+                try:
+                    text = chunk.text
+                except ValueError:
+                    continue
+                if text:
+                    metrics.first_chunk(call)
+                    yield text
+
+
+# --- EMBALLAGES DE FLUX ---
+def _store_at_end(chunks, store):
+    """Mémorise la réponse une fois le flux terminé (jamais un flux interrompu)."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    if parts:
+        store("".join(parts))
+
+
+def _then(chunks, done):
+    yield from chunks
+    done()
+
+
+def _or_fallback(chunks, fallback):
+    try:
+        yield from chunks
+    except airbag.RETRYABLE:
+        yield fallback
+
+
+async def _store_at_end_async(chunks, store):
+    parts = []
+    async for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    if parts:
+        store("".join(parts))
+
+
+async def _then_async(chunks, done):
+    async for chunk in chunks:
+        yield chunk
+    done()
+
+
+async def _or_fallback_async(chunks, fallback):
+    try:
+        async for chunk in chunks:
+            yield chunk
+    except airbag.RETRYABLE:
+        yield fallback
+
+
+async def _once(text):
+    yield text
+
+
+@dataclass
+class _Call:
+    """Un appel préparé : ce qui part chez Gemini, et où ranger la réponse."""
+    agent: Agent
+    model: object = None
+    chat: object = None
+    prompt: str = ""
+    cached: Optional[str] = None     # réponse servie par un cache : pas d'appel
+    store: object = None             # store(texte) après un appel réussi
+    done: object = None              # done() une fois la réponse reçue en entier (ex: forget_extras)
+
+
+# --- LE MOTEUR ---
+class Engine:
+    """Exécute n'importe quel agent du registre avec les mêmes étages (cache, airbag, métriques)."""
+
+    def __init__(self, agents=AGENTS):
+        self.agents = dict(agents)
+
+    def register(self, agent):
+        self.agents[agent.name] = agent
+
+    def _prepare(self, name, api_key, history, dedup, pdf_index, pdf_text, pdf_hash, variables):
+        agent = self.agents[name]
+        for var in agent.truncate:
+            variables[var] = truncate_to_budget(variables.get(var) or "", agent.budget)
+        system = agent.system.format(**variables)
+        request = agent.request.format(**variables)
+        bare = request  # ce que la ChatSession doit garder : sans extraits ni brouillon
+        call = _Call(agent)
+
+        # Historique : la ChatSession vivante (Professeur), ou une fenêtre bornée par le budget de l'agent
+        turns = None
+        if agent.history and not agent.session:
+            turns = window(history, agent.name, agent.budget)
+
+        def with_extraits(request):
+            # Extraits du PDF pour la question posée, sinon pour les derniers tours (Examinateur)
+            if pdf_index is None:
+                return request
+            from pdf_index import extraits_pour, query_from_history
+            query = variables.get("question") or query_from_history(turns if turns is not None else as_history(history))
+            return extraits_pour(pdf_index, query, k=agent.extraits) + request
+
+        if agent.extraits and not agent.context_cache:
+            request = with_extraits(request)  # avant le cache : les extraits font partie de la clé
+
+        # Caches : EXACT sur (agent, système, historique, requête) ; SEMANTIQUE sur (plan, PDF) + question
+        if agent.cache == EXACT:
+            # Clé sans les réponses des spécialistes : un 2e clic sur 😈 / 📝 retombe sur la même réponse
+            key_turns = None if turns is None else [t for t in as_history(history) or [] if not specialist_turn(t)]
+            key = response_cache.make_key(agent.name, system, key_turns, request, model_name=agent.model)
+            call.cached = response_cache.cache.get(key)
+            metrics.cache_event(agent.name, hit=call.cached is not None)
+            if call.cached is not None:
+                return call
+            call.store = lambda text: response_cache.cache.set(key, text)
+        elif agent.cache == SEMANTIQUE and dedup:
+            import semantic_cache
+            question = request
+            scope = semantic_cache.scope_for(system, pdf_hash)
+            match = semantic_cache.cache.lookup(scope, question)
+            metrics.cache_event(f"{agent.name}-semantique", hit=match is not None and match.reusable)
+            if match is not None and match.reusable:
+                call.cached = match.answer
+                return call
+            if match is not None:
+                request = semantic_cache.draft_prompt(match, question)  # réponse proche : brouillon à adapter
+            call.store = lambda text: semantic_cache.cache.add(scope, question, text)
+
+        # Modèle : adossé au cache de contexte si plan + PDF sont assez gros (le cours y est déjà entier)
+        if agent.context_cache:
+            call.model = context_cache.model_for(api_key, system, pdf_text, pdf_hash)
+        if call.model is None:
+            call.model = model_registry.get_model(api_key, system, agent.model)
+            if agent.extraits and agent.context_cache:
+                # Sans cache de contexte : seuls les morceaux du PDF utiles à CETTE question partent avec elle
+                request = with_extraits(request)
+        if agent.session:
+            call.chat = open_chat(call.model, history, agent.name, agent.budget)  # Conversation -> ChatSession réutilisée
+            if request != bare:
+                # Extraits / brouillon : pour cette réponse seulement, pas pour les tours suivants
+                call.done = lambda: forget_extras(call.chat, bare)
+        elif agent.history:
+            call.chat = call.model.start_chat(history=turns)
+        call.prompt = request
+        return call
+
+    def run(self, name, api_key, history=None, stream=None, fallback=None, dedup=False,
+            pdf_index=None, pdf_text="", pdf_hash=None, **variables):
+        """Texte complet, ou générateur de morceaux si l'agent (ou `stream`) le demande.
+
+        Quota épuisé malgré les retries : l'exception remonte (les tâches de fond
+        la retentent), sauf si `fallback` est donné, qui est alors renvoyé à la
+        place (jamais mis en cache).
+        """
+        call = self._prepare(name, api_key, history, dedup, pdf_index, pdf_text, pdf_hash, variables)
+        stream = call.agent.stream if stream is None else stream
+        if call.cached is not None:
+            return iter([call.cached]) if stream else call.cached
+        if stream:
+            chunks = generate_stream(name, api_key, call.model, call.chat, call.prompt)
+            if call.store is not None:
+                chunks = _store_at_end(chunks, call.store)
+            if call.done is not None:
+                chunks = _then(chunks, call.done)
+            return chunks if fallback is None else _or_fallback(chunks, fallback)
+        try:
+            text = generate(name, api_key, call.model, call.chat, call.prompt)
+        except airbag.RETRYABLE:
+            if fallback is None:
+                raise
+            return fallback
+        if call.done is not None:
+            call.done()
+        if text and call.store is not None:
+            call.store(text)
+        return text
+
+    async def run_async(self, name, api_key, history=None, stream=None, fallback=None, dedup=False,
+                        pdf_index=None, pdf_text="", pdf_hash=None, **variables):
+        """Comme run() sur la boucle d'async_runtime ; avec stream, renvoie un générateur asynchrone."""
+        call = self._prepare(name, api_key, history, dedup, pdf_index, pdf_text, pdf_hash, variables)
+        stream = call.agent.stream if stream is None else stream
+        if call.cached is not None:
+            return _once(call.cached) if stream else call.cached
+        if stream:
+            chunks = generate_stream_async(name, api_key, call.model, call.chat, call.prompt)
+            if call.store is not None:
+                chunks = _store_at_end_async(chunks, call.store)
+            if call.done is not None:
+                chunks = _then_async(chunks, call.done)
+            return chunks if fallback is None else _or_fallback_async(chunks, fallback)
+        try:
+            text = await generate_async(name, api_key, call.model, call.chat, call.prompt)
+        except airbag.RETRYABLE:
+            if fallback is None:
+                raise
+            return fallback
+        if call.done is not None:
+            call.done()
+        if text and call.store is not None:
+            call.store(text)
+        return text
+
+    def run_many(self, api_key, calls, history=None, fallback=None, **shared):
+        """Plusieurs agents en même temps (pool de fanout) : le temps d'un agent au lieu de N.
+
+        `calls` = [(titre, nom de l'agent, variables)]. Tous voient le même
+        instantané de l'historique. Renvoie [(titre, texte)] dans l'ordre des
+        appels ; un agent en échec n'empêche pas les autres de répondre.
+        """
+        snapshot = as_history(history)  # liste figée, commune à tous
+        tasks = [(title, lambda n=name, v=variables: self.run(n, api_key, snapshot, stream=False, fallback=fallback,
+                                                               **dict(shared, **v)))
+                 for title, name, variables in calls]
+        return [
+            (title, text if error is None else fallback or f"⚠️ Agent indisponible ({type(error).__name__}).")
+            for title, text, error in run_parallel(tasks)
+        ]
+
+
+engine = Engine()
+
+
+def run(name, api_key, history=None, **options):
+    """Raccourci vers le moteur du process."""
+    return engine.run(name, api_key, history, **options)
+
+
+async def run_async(name, api_key, history=None, **options):
+    return await engine.run_async(name, api_key, history, **options)
+
+
+def run_many(api_key, calls, history=None, **options):
+    return engine.run_many(api_key, calls, history, **options)
@@ -0,0 +1,213 @@
+"""L'AIRBAG partagé : retries intelligents + limiteur de débit par clé d'API.
+
+Remplace les `time.sleep(15)` / `time.sleep(10)` fixes de super_prof.py et
+interface.py. Tout est injectable (horloge, sommeil, hasard) pour pouvoir
+rejouer le moteur contre un faux modèle qui lève des erreurs sur un planning.
+"""
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable
+
+# Erreurs pour lesquelles réessayer a un sens (quota, serveur saturé)
+RETRYABLE = (ResourceExhausted, ServiceUnavailable)
+
+# Quota d'une clé Gemini Flash au palier gratuit (requêtes par minute) ; GEMINI_RPM dans les secrets sinon
+RPM_PAR_DEFAUT = 15
+
+
+class Surcharge(ResourceExhausted):
+    """Levée localement quand on renonce SANS appeler l'API (budget, deadline, limiteur).
+
+    Hérite de ResourceExhausted : le code qui attrapait déjà l'erreur de Google
+    n'a rien à changer.
+    """
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Réglages du backoff exponentiel avec jitter."""
+    max_attempts: int = 4        # tentatives au total (1 appel + 3 retries)
+    base_delay: float = 1.0      # délai avant le 1er retry (secondes)
+    max_delay: float = 20.0      # plafond d'un délai
+    multiplier: float = 2.0
+    deadline: float = 45.0       # temps total max pour un appel, attente comprise
+
+    def delay(self, retry_index, rng=random.random):
+        """Délai avant le retry n°retry_index (0, 1, ...) : "full jitter"."""
+        plafond = min(self.max_delay, self.base_delay * self.multiplier ** retry_index)
+        return plafond * rng()
+
+
+DEFAULT_POLICY = RetryPolicy()
+
+
+class RetryBudget:
+    """Budget de retries partagé : on ne réessaie que si assez d'appels ont réussi.
+
+    Chaque premier essai dépose `ratio` jeton, chaque retry en consomme un.
+    Sous une tempête de 429, le budget s'épuise et on arrête d'en rajouter.
+    """
+
+    def __init__(self, ratio=0.2, min_tokens=10, max_tokens=100):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = float(min_tokens)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        """Renvoie True si un retry est autorisé (et le décompte)."""
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class TokenBucket:
+    """Limiteur "seau à jetons" : `rate` requêtes/seconde, rafales jusqu'à `capacity`."""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def reserve(self):
+        """Prend un jeton (quitte à s'endetter) et renvoie l'attente nécessaire en secondes."""
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def cancel(self):
+        """Rend un jeton réservé mais finalement pas utilisé."""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + 1)
+
+    def drain(self):
+        """Google vient de répondre 429 : on vide le seau pour que les autres patientent."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(api_key, rpm=None):
+    """Un seul limiteur par clé d'API pour tout le process (toutes sessions confondues).
+
+    `rpm` règle le quota de la clé (ex: lu dans st.secrets au démarrage) ;
+    sans lui, on garde le limiteur existant, ou RPM_PAR_DEFAUT (palier gratuit).
+    """
+    with _limiters_lock:
+        bucket = _limiters.get(api_key)
+        if bucket is None or (rpm and bucket.capacity != rpm):
+            rpm = rpm or RPM_PAR_DEFAUT
+            bucket = _limiters[api_key] = TokenBucket(rate=rpm / 60.0, capacity=rpm)
+        return bucket
+
+
+GLOBAL_BUDGET = RetryBudget()
+
+
+def call_with_retry(fn, policy=None, limiter=None, budget=GLOBAL_BUDGET,
+                    cancel=None, sleep=time.sleep, clock=time.monotonic,
+                    rng=random.random, retryable=RETRYABLE, on_retry=None):
+    """Appelle fn() avec backoff exponentiel + jitter.
+
+    - limiter : TokenBucket de la clé, consulté avant CHAQUE tentative.
+    - budget  : RetryBudget partagé, consulté avant chaque retry.
+    - cancel  : threading.Event optionnel ; s'il est levé pendant une attente, on abandonne.
+    - on_retry(n, erreur, délai) est appelé avant chaque attente (métriques, logs).
+
+    On renonce dès qu'une attente ferait dépasser la deadline de la politique :
+    la dernière erreur de Google est relevée, ou Surcharge si on n'a rien pu envoyer.
+    """
+    policy = policy or DEFAULT_POLICY  # lue à l'appel : réglable globalement (benchmarks)
+    fin = clock() + policy.deadline
+
+    def attendre(secondes):
+        if cancel is not None:
+            if cancel.wait(secondes):
+                raise Surcharge("Appel annulé.")
+        elif secondes > 0:
+            sleep(secondes)
+
+    for tentative in range(policy.max_attempts):
+        if limiter is not None:
+            attente = limiter.reserve()
+            if clock() + attente > fin:
+                limiter.cancel()
+                raise Surcharge("Quota local atteint : l'appel dépasserait la deadline.")
+            attendre(attente)
+        if tentative == 0 and budget is not None:
+            budget.deposit()
+        try:
+            return fn()
+        except retryable as e:
+            if limiter is not None:
+                limiter.drain()
+            derniere = tentative == policy.max_attempts - 1
+            delai = policy.delay(tentative, rng)
+            if derniere or clock() + delai > fin:
+                raise
+            if budget is not None and not budget.withdraw():
+                raise
+            if on_retry is not None:
+                on_retry(tentative + 1, e, delai)
+            attendre(delai)
+
+
+async def call_with_retry_async(fn, policy=None, limiter=None, budget=GLOBAL_BUDGET,
+                                clock=time.monotonic, rng=random.random, retryable=RETRYABLE,
+                                on_retry=None):
+    """Version asyncio de call_with_retry.
+
+    `fn()` renvoie une coroutine, les attentes sont des `asyncio.sleep` (la
+    boucle reste libre) et l'annulation est celle de la tâche (CancelledError).
+    """
+    policy = policy or DEFAULT_POLICY
+    fin = clock() + policy.deadline
+    for tentative in range(policy.max_attempts):
+        if limiter is not None:
+            attente = limiter.reserve()
+            if clock() + attente > fin:
+                limiter.cancel()
+                raise Surcharge("Quota local atteint : l'appel dépasserait la deadline.")
+            if attente > 0:
+                await asyncio.sleep(attente)
+        if tentative == 0 and budget is not None:
+            budget.deposit()
+        try:
+            return await fn()
+        except retryable as e:
+            if limiter is not None:
+                limiter.drain()
+            derniere = tentative == policy.max_attempts - 1
+            delai = policy.delay(tentative, rng)
+            if derniere or clock() + delai > fin:
+                raise
+            if budget is not None and not budget.withdraw():
+                raise
+            if on_retry is not None:
+                on_retry(tentative + 1, e, delai)
+            await asyncio.sleep(delai)
@@ -0,0 +1,97 @@
+"""Boucle asyncio partagée par tout le process, pour les agents asynchrones.
+
+Le client asynchrone de Gemini (gRPC aio) est lié à la boucle qui l'a créé :
+un `asyncio.run()` par appel recréerait une connexion à chaque fois. Ici une
+seule boucle tourne dans un thread de fond, donc le client et ses connexions
+sont réutilisés. On y ajoute :
+- une concurrence bornée (MAX_CONCURRENT appels Gemini simultanés) ;
+- des groupes d'annulation : tout ce qui a été lancé pour une session est
+  annulé quand l'utilisateur la quitte.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+MAX_CONCURRENT = 16
+
+_loop = None
+_lock = threading.Lock()
+_semaphore = None
+_groups = defaultdict(set)  # groupe (ex: session_id) -> futures en cours
+
+
+def get_loop():
+    """Démarre la boucle de fond au premier besoin et la renvoie."""
+    global _loop, _semaphore
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="agents-async", daemon=True).start()
+            _semaphore = asyncio.Semaphore(MAX_CONCURRENT)
+            _loop = loop
+        return _loop
+
+
+def limit():
+    """Sémaphore de la boucle partagée : `async with async_runtime.limit(): ...`."""
+    get_loop()
+    return _semaphore
+
+
+def submit(coro, group=None):
+    """Planifie `coro` sur la boucle partagée depuis n'importe quel thread.
+
+    Renvoie un concurrent.futures.Future. Avec `group`, la tâche pourra être
+    annulée par cancel_group(group).
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    if group is not None:
+        with _lock:
+            _groups[group].add(future)
+        future.add_done_callback(lambda f: _forget(group, f))
+    return future
+
+
+def _forget(group, future):
+    with _lock:
+        _groups[group].discard(future)
+        if not _groups[group]:
+            del _groups[group]
+
+
+def run(coro, group=None, timeout=None):
+    """Exécute `coro` sur la boucle partagée et attend son résultat (appelant synchrone)."""
+    return submit(coro, group).result(timeout=timeout)
+
+
+async def on_loop(coro, group=None):
+    """Attend `coro` exécutée sur la boucle partagée, quelle que soit la boucle de l'appelant.
+
+    Le sémaphore et le client Gemini asynchrone appartiennent à la boucle
+    partagée : un `asyncio.run(...)` de l'appelant ne doit pas y toucher.
+    """
+    if asyncio.get_running_loop() is get_loop():
+        return await coro
+    return await asyncio.wrap_future(submit(coro, group))
+
+
+_FIN = object()
+
+
+async def iterate_on_loop(chunks, group=None):
+    """Générateur asynchrone dont chaque morceau est produit sur la boucle partagée (streaming)."""
+    async def step():
+        try:
+            return await chunks.__anext__()
+        except StopAsyncIteration:
+            return _FIN
+
+    while (chunk := await on_loop(step(), group)) is not _FIN:
+        yield chunk
+
+
+def cancel_group(group):
+    """Annule tout ce qui tourne encore pour `group` ; renvoie le nombre de tâches annulées."""
+    with _lock:
+        futures = list(_groups.get(group, ()))
+    return sum(1 for f in futures if f.cancel())
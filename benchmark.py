@@ -0,0 +1,292 @@
+"""Benchmark hors-ligne de Super Prof : faux Gemini + faux Firestore, zéro réseau.
+
+Rejoue des sessions scriptées à travers les vrais agents (super_prof), le
+tampon d'écriture, la lecture paginée de l'historique et la fusion d'un
+sous-arbre, puis affiche p50/p95 par opération, appels Gemini par tour et
+octets envoyés. Pour suivre les régressions d'un commit à l'autre :
+
+    python benchmark.py --json bench_avant.json
+    python benchmark.py --baseline bench_avant.json
+"""
+import argparse
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import airbag
+import context_cache
+import metrics
+import model_registry
+import response_cache
+import semantic_cache
+import storage
+import super_prof
+from agents import signed
+from context_window import maybe_compact
+from conversation import Conversation
+from fakes import FakeContextBackend, FakeFirestore, FakeGemini
+from model_registry import ModelRegistry
+from pdf_index import build_index
+from session_ops import fuse_subtree, read_history
+from session_tree import SessionTree
+from write_buffer import WriteBuffer
+
+API_KEY = "bench"
+USERNAME = "bench"
+
+QUESTIONS = [
+    "C'est quoi une dérivée ?",
+    "Pourquoi la dérivée de x² vaut 2x ?",
+    "Et pour une fonction composée ?",
+    "Donne-moi un exemple avec une exponentielle.",
+    "Comment on trouve un maximum ?",
+    "Quel lien avec la tangente ?",
+    "Je ne comprends pas la règle du quotient.",
+    "Tu peux refaire l'exemple plus lentement ?",
+]
+
+PDF_PAGES = [
+    f"Page {i}. La dérivée mesure la variation instantanée d'une fonction. "
+    f"Règle {i} : dérivée de x^{i} = {i} x^{i - 1}. Tangente, maximum, exponentielle."
+    for i in range(1, 13)
+]
+
+
+class Recorder:
+    """Chronomètre par opération, et compte des appels d'agents abandonnés (quota épuisé)."""
+
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self.failures = defaultdict(int)
+
+    @contextmanager
+    def time(self, op):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[op].append(time.perf_counter() - start)
+
+    @contextmanager
+    def agent(self, op):
+        """Comme time(), mais un agent en surcharge après ses retries est compté, pas fatal."""
+        with self.time(op):
+            try:
+                yield
+            except airbag.RETRYABLE:
+                self.failures[op] += 1
+
+    def add(self, op, seconds):
+        self.timings[op].append(seconds)
+
+    def summary(self):
+        return {
+            op: {
+                "n": len(v),
+                "p50_ms": round(metrics.percentile(v, 50) * 1000, 2),
+                "p95_ms": round(metrics.percentile(v, 95) * 1000, 2),
+            }
+            for op, v in sorted(self.timings.items())
+        }
+
+
+def install(args):
+    """Branche les faux backends à la place de Gemini et Firestore."""
+    gemini = FakeGemini(latency=args.latency, response_chars=args.response_chars,
+                        throttle_every=args.throttle_every, throttle_rate=args.throttle_rate,
+                        seed=args.seed)
+    db = FakeFirestore(latency=args.db_latency)
+    model_registry.registry = ModelRegistry(factory=gemini.model, configure=gemini.configure)
+    response_cache.cache = response_cache.ResponseCache()
+    metrics.metrics = metrics.Metrics()
+    semantic_cache.cache = semantic_cache.SemanticCache()
+    # --context-cache : le plan + le PDF entier passent par le (faux) cache de contexte Gemini
+    context_cache.cache = context_cache.ContextCache(
+        backend=FakeContextBackend(gemini), min_tokens=0 if args.context_cache else context_cache.MIN_TOKENS)
+    # Backoff réduit (on mesure l'app, pas les attentes) ; quota local large
+    airbag.DEFAULT_POLICY = airbag.RetryPolicy(base_delay=args.latency, max_delay=args.latency * 4, deadline=30.0)
+    airbag.get_limiter(API_KEY, rpm=args.rpm)
+    return gemini, db
+
+
+def professor_turn(rec, conv, question, plan, index, dedup=False):
+    start = time.perf_counter()
+    first = None
+    parts = []
+    pdf_text = "\n".join(PDF_PAGES)
+    try:
+        for chunk in super_prof.get_professor_response(API_KEY, conv, question, plan, stream=True, pdf_index=index,
+                                                       pdf_text=pdf_text, pdf_hash="bench-pdf", dedup=dedup):
+            if first is None:
+                first = time.perf_counter() - start
+                rec.add("professeur_ttft", first)
+            parts.append(chunk)
+    except airbag.RETRYABLE:
+        rec.failures["professeur"] += 1
+    rec.add("professeur", time.perf_counter() - start)
+    return "".join(parts)
+
+
+def run_session(rec, db, session_id, turns, plan, index, dedup=False):
+    """Une session d'étude : questions au Professeur, quiz, fiche, revue."""
+    conv = Conversation(session_id)
+    buffer = WriteBuffer(db, interval=0)
+
+    def summarize(history):
+        summary = super_prof.get_scribe_summary(API_KEY, history, mode="fusion", fallback="")
+        if not summary:
+            rec.failures["compaction"] += 1  # maybe_compact réessaiera au tour suivant
+        return summary or None
+
+    for i in range(turns):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        with rec.time("save_msg"):
+            buffer.add(storage.message_doc(session_id, USERNAME, "user", question))
+        answer = professor_turn(rec, conv, question, plan, index, dedup)
+        conv.append("user", question)
+        conv.append("assistant", answer)
+        with rec.time("save_msg"):
+            buffer.add(storage.message_doc(session_id, USERNAME, "assistant", answer))
+        with rec.time("compaction"):
+            maybe_compact(conv, summarize)
+
+        if i % 5 == 4:
+            with rec.agent("examinateur"):
+                super_prof.get_examiner_quiz(API_KEY, conv.history, stream=False, pdf_index=index)
+        if i % 10 == 9:
+            with rec.time("revue_complete"):
+                revue = super_prof.get_full_review(API_KEY, conv.history, pdf_index=index, fallback="")
+            if any(not texte for _, texte in revue):
+                rec.failures["revue_complete"] += sum(not texte for _, texte in revue)
+
+    with rec.agent("scribe_fiche"):
+        fiche = super_prof.get_scribe_summary(API_KEY, conv.history, mode="fiche")
+        conv.append("assistant", signed("fiche", fiche))  # comme l'interface : la fiche rejoint la conversation
+    with rec.agent("scribe_fiche_rejouee"):  # seule la fiche s'est ajoutée : doit sortir du cache
+        super_prof.get_scribe_summary(API_KEY, conv.history, mode="fiche")
+    with rec.time("flush"):
+        buffer.flush()
+
+    page, cursor = [], None
+    while True:
+        with rec.time("load_messages"):
+            page = storage.load_messages(db, session_id, limit=20, before=cursor)
+        if len(page) < 20:
+            break
+        cursor = page[0]["timestamp"]
+
+
+def run_fusion(rec, db, width, depth, turns):
+    """Construit un arbre width^depth de sessions remplies, puis le fusionne entièrement."""
+    docs, buffer = [], WriteBuffer(db, interval=0, max_size=500)
+    frontier = [None]
+    for level in range(depth + 1):
+        nxt = []
+        for parent in frontier:
+            for n in range(1 if parent is None else width):
+                sid = f"s{level}-{len(docs)}"
+                docs.append({"session_id": sid, "parent_id": parent, "title": f"Dossier {sid}", "username": USERNAME})
+                for i in range(turns):
+                    buffer.add(storage.message_doc(sid, USERNAME, "user", QUESTIONS[i % len(QUESTIONS)]))
+                    buffer.add(storage.message_doc(sid, USERNAME, "assistant", "Réponse archivée. " * 20))
+                nxt.append(sid)
+        frontier = nxt
+    buffer.flush()
+
+    tree = SessionTree(docs)
+    with rec.agent("fusion_sous_arbre"):
+        fuse_subtree(tree, docs[0]["session_id"], lambda sid: read_history(db, sid),
+                     lambda h: super_prof.get_scribe_summary(API_KEY, h, mode="fusion"))
+    return len(docs)
+
+
+def run(args):
+    gemini, db = install(args)
+    rec = Recorder()
+    index = build_index(PDF_PAGES)
+
+    start = time.perf_counter()
+    with rec.time("manager"):
+        plan = super_prof.get_manager_plan(API_KEY, "Comprendre les dérivées", "\n".join(PDF_PAGES), fallback="")
+    if not plan:
+        rec.failures["manager"] += 1
+        plan = "Contexte libre"
+    for s in range(args.sessions):
+        run_session(rec, db, f"session-{s}", args.turns, plan, index, args.semantic)
+    turn_calls = gemini.stats["calls"]
+    fused = run_fusion(rec, db, args.width, args.depth, args.fusion_turns)
+    wall = time.perf_counter() - start
+
+    turns = args.sessions * args.turns
+    return {
+        "config": vars(args),
+        "wall_s": round(wall, 3),
+        "ops": rec.summary(),
+        "gemini": dict(gemini.stats, calls_per_turn=round(turn_calls / turns, 2) if turns else 0.0),
+        "firestore": dict(db.stats),
+        "cache": response_cache.cache.stats(),
+        "context_cache": context_cache.cache.stats(),
+        "semantic_cache": semantic_cache.cache.stats(),
+        "agents": metrics.metrics.snapshot(),
+        "echecs": dict(rec.failures),
+        "sessions_fusionnees": fused,
+    }
+
+
+def print_report(report, baseline=None):
+    base_ops = (baseline or {}).get("ops", {})
+    print(f"{'opération':<22}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}")
+    for op, s in report["ops"].items():
+        line = f"{op:<22}{s['n']:>6}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}"
+        if op in base_ops and base_ops[op]["p95_ms"]:
+            delta = (s["p95_ms"] - base_ops[op]["p95_ms"]) / base_ops[op]["p95_ms"] * 100
+            line += f"   p95 {delta:+.0f}%"
+        print(line)
+    g, f = report["gemini"], report["firestore"]
+    print(f"\nGemini    : {g['calls']} appels ({g['calls_per_turn']}/tour), {g.get('throttled', 0)} throttlés, "
+          f"{g['bytes_sent']} octets envoyés, ~{g.get('prompt_tokens', 0)} tokens de prompt")
+    print(f"Firestore : {f['round_trips']} allers-retours, {f['writes']} écritures, {f['reads']} lectures, "
+          f"{f['bytes_sent']} octets envoyés")
+    c = report["cache"]
+    print(f"Cache     : {c['hits']} hits / {c['misses']} misses ({c['hit_rate']:.0%})")
+    echecs = report.get("echecs") or {}
+    if echecs:
+        detail = ", ".join(f"{op} {n}" for op, n in sorted(echecs.items()))
+        print(f"Échecs    : {sum(echecs.values())} appels abandonnés après retries ({detail})")
+    print(f"Total     : {report['wall_s']} s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=3)
+    parser.add_argument("--turns", type=int, default=20, help="questions au Professeur par session")
+    parser.add_argument("--latency", type=float, default=0.02, help="latence d'un appel Gemini (s)")
+    parser.add_argument("--db-latency", type=float, default=0.002, help="latence d'un aller-retour Firestore (s)")
+    parser.add_argument("--response-chars", type=int, default=800)
+    parser.add_argument("--throttle-every", type=int, default=0, help="un 429 tous les N appels (0 = jamais)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="probabilité de 429 par appel")
+    parser.add_argument("--rpm", type=int, default=100000, help="quota local du limiteur")
+    parser.add_argument("--width", type=int, default=3, help="enfants par dossier (fusion)")
+    parser.add_argument("--depth", type=int, default=2, help="profondeur de l'arbre (fusion)")
+    parser.add_argument("--fusion-turns", type=int, default=6)
+    parser.add_argument("--context-cache", action="store_true", help="préfixe plan + PDF via le cache de contexte")
+    parser.add_argument("--semantic", action="store_true", help="cache sémantique des questions du Professeur")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="écrit le rapport dans ce fichier")
+    parser.add_argument("--baseline", help="rapport JSON précédent à comparer")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    report = run(args)
+    print_report(report, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Cache de contexte Gemini ("cached content") pour les préfixes statiques : plan + PDF.
+
+Le Professeur renvoie à chaque tour le même préfixe : son system_instruction
+(qui contient le plan du Manager) et, quand un PDF est chargé, le cours
+lui-même. Ici ce préfixe est déposé UNE fois côté Google
+(`caching.CachedContent`), puis les tours suivants passent par un modèle
+construit sur ce cache : seuls la question et l'historique repartent.
+
+La tenue de livres est locale : (hash du plan, hash du PDF) -> handle du cache
+Google + date d'expiration. Le backend est injectable (FakeContextBackend dans
+fakes.py) pour tester sans réseau.
+
+L'API refuse les caches trop petits (MIN_TOKENS) : en dessous, `model_for`
+renvoie None et l'agent garde son modèle habituel (model_registry).
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import timedelta
+
+import model_registry
+from context_window import count_tokens
+from model_registry import prompt_hash
+
+MIN_TOKENS = 32768                              # minimum accepté par l'API pour un cache
+TTL = 3600                                      # durée de vie demandée (secondes)
+MARGE = 60                                      # un handle qui expire dans moins d'une minute est renouvelé
+MODELE_CACHE = "models/gemini-1.5-flash-002"    # le cache exige une version figée du modèle
+
+
+def pdf_turns(pdf_text):
+    """Le cours tel qu'il est déposé dans le cache (un tour utilisateur)."""
+    return [{"role": "user", "parts": [f"Document de cours (PDF) :\n{pdf_text}"]}] if pdf_text else []
+
+
+@dataclass
+class Handle:
+    name: str          # nom du CachedContent côté Google ("cachedContents/...")
+    expires_at: float  # horloge locale
+    tokens: int        # taille estimée du préfixe
+
+
+class GenaiBackend:
+    """Backend réel : google.generativeai.caching."""
+
+    def create(self, api_key, model_name, system_instruction, contents, ttl):
+        from google.generativeai import caching
+        model_registry.configure(api_key)  # config globale partagée : pas de reconfiguration concurrente
+        cached = caching.CachedContent.create(model=model_name, system_instruction=system_instruction,
+                                              contents=contents, ttl=timedelta(seconds=ttl))
+        return cached.name
+
+    def model(self, name):
+        import google.generativeai as genai
+        from google.generativeai import caching
+        return genai.GenerativeModel.from_cached_content(cached_content=caching.CachedContent.get(name))
+
+    def delete(self, name):
+        from google.generativeai import caching
+        caching.CachedContent.get(name).delete()
+
+
+class ContextCache:
+    def __init__(self, backend=None, ttl=TTL, min_tokens=MIN_TOKENS, max_entries=32,
+                 model_name=MODELE_CACHE, clock=time.time):
+        self.backend = backend or GenaiBackend()
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.max_entries = max_entries
+        self.model_name = model_name
+        self._clock = clock
+        self._handles = OrderedDict()  # (hash plan, hash PDF) -> Handle
+        self._models = {}              # nom du handle -> modèle construit dessus
+        self._failed = {}              # clé -> date avant laquelle on ne retente pas
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    @staticmethod
+    def key(system_instruction, pdf_hash=None):
+        return prompt_hash(system_instruction), pdf_hash or ""
+
+    def lookup(self, key):
+        """Handle encore valide pour `key`, ou None (les handles expirés sont oubliés)."""
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is None:
+                return None
+            if handle.expires_at - min(MARGE, self.ttl / 10) <= self._clock():
+                self._forget(key)
+                return None
+            self._handles.move_to_end(key)
+            return handle
+
+    def _forget(self, key):
+        handle = self._handles.pop(key, None)
+        if handle is not None:
+            self._models.pop(handle.name, None)
+        return handle
+
+    def model_for(self, api_key, system_instruction, pdf_text="", pdf_hash=None):
+        """Modèle adossé au cache pour ce préfixe, ou None s'il ne vaut pas (ou plus) la peine.
+
+        Un échec de création (quota, modèle non supporté...) n'est pas retenté
+        avant la fin du TTL : pas d'aller-retour inutile à chaque tour.
+        """
+        tokens = count_tokens(system_instruction) + count_tokens(pdf_text)
+        if tokens < self.min_tokens:
+            return None
+        key = self.key(system_instruction, pdf_hash or (prompt_hash(pdf_text) if pdf_text else None))
+        handle = self.lookup(key)
+        if handle is None:
+            with self._lock:
+                if self._failed.get(key, 0) > self._clock():
+                    return None
+            try:
+                name = self.backend.create(api_key, self.model_name, system_instruction, pdf_turns(pdf_text), self.ttl)
+            except Exception:
+                with self._lock:
+                    self._failed[key] = self._clock() + self.ttl
+                return None
+            handle = Handle(name, self._clock() + self.ttl, tokens)
+            with self._lock:
+                self._handles[key] = handle
+                self.created += 1
+                evicted = []
+                while len(self._handles) > self.max_entries:
+                    evicted.append(self._forget(next(iter(self._handles))))
+            for old in evicted:
+                self._delete(old)
+        else:
+            with self._lock:
+                self.reused += 1
+        with self._lock:
+            model = self._models.get(handle.name)
+        if model is None:
+            model = self.backend.model(handle.name)
+            with self._lock:
+                self._models[handle.name] = model
+        return model
+
+    def _delete(self, handle):
+        try:
+            self.backend.delete(handle.name)
+        except Exception:
+            pass  # il expirera tout seul côté Google
+
+    def stats(self):
+        with self._lock:
+            return {"handles": len(self._handles), "created": self.created, "reused": self.reused,
+                    "cached_tokens": sum(h.tokens for h in self._handles.values())}
+
+
+cache = ContextCache()
+
+
+def model_for(api_key, system_instruction, pdf_text="", pdf_hash=None):
+    """Raccourci vers le cache de contexte du process."""
+    return cache.model_for(api_key, system_instruction, pdf_text, pdf_hash)
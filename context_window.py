@@ -0,0 +1,112 @@
+"""Gestion de la fenêtre de contexte : budget de tokens par agent + résumé glissant.
+
+- les KEEP_LAST derniers tours restent mot pour mot ;
+- les plus vieux sont compressés dans un résumé glissant (prompt "fusion" du
+  Scribe), stocké sur la Conversation et mis en cache ;
+- chaque agent a un budget de tokens qu'on ne dépasse pas.
+"""
+from conversation import Conversation, summary_turns
+
+# Budgets en tokens (approximatifs) par agent
+BUDGETS = {
+    "professeur": 6000,
+    "examinateur": 4000,
+    "coach": 2000,
+    "scribe": 8000,
+    "manager_pdf": 6000,
+}
+
+KEEP_LAST = 12   # tours gardés mot pour mot
+SLACK = 8        # on ne re-résume qu'après SLACK tours de plus (évite un appel Scribe par tour)
+
+CHARS_PAR_TOKEN = 4
+
+
+def count_tokens(text):
+    """Estimation locale (~4 caractères par token) : pas d'appel réseau pour compter."""
+    return (len(text or "") + CHARS_PAR_TOKEN - 1) // CHARS_PAR_TOKEN
+
+
+def turn_tokens(turn):
+    return sum(count_tokens(str(p)) for p in turn.get("parts", []))
+
+
+def history_tokens(history):
+    return sum(turn_tokens(t) for t in history)
+
+
+def truncate_to_budget(text, budget):
+    """Coupe `text` pour tenir dans `budget` tokens, sur une fin de mot."""
+    limit = budget * CHARS_PAR_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > limit // 2 else limit] + "…"
+
+
+def window(history, agent, budget=None):
+    """Historique à envoyer à `agent`, raboté par le début pour tenir dans son budget.
+
+    Le résumé glissant (s'il existe) est gardé : on sacrifie d'abord les vieux
+    tours mot pour mot. Le dernier échange est toujours gardé. `budget` (tokens)
+    remplace celui de BUDGETS[agent].
+    """
+    budget = budget if budget is not None else BUDGETS.get(agent)
+    if isinstance(history, Conversation):
+        head = summary_turns(history.summary) if history.summary else []
+        tail = history.history[history.summarized_upto:]
+    else:
+        head, tail = [], list(history or [])
+    if budget is None:
+        return head + tail
+    total = history_tokens(head) + history_tokens(tail)
+    start = 0
+    while total > budget and start < len(tail) - 2:
+        total -= turn_tokens(tail[start])
+        start += 1
+    return head + tail[start:]
+
+
+def maybe_compact(conv, summarize, keep_last=KEEP_LAST, budget=None):
+    """Fait glisser le résumé si la partie mot pour mot devient trop longue.
+
+    `summarize(history)` reçoit l'ancien résumé + les tours à compresser et
+    renvoie le nouveau résumé (ou None en cas d'échec : on ne touche à rien).
+    Renvoie True si la Conversation a été compactée.
+    """
+    budget = budget or BUDGETS["professeur"]
+    tail = conv.history[conv.summarized_upto:]
+    summary_cost = count_tokens(conv.summary)
+    too_long = len(tail) > keep_last + SLACK
+    too_big = summary_cost + history_tokens(tail) > budget
+    if not (too_long or too_big):
+        return False
+
+    cut = max(conv.summarized_upto, len(conv.history) - keep_last)
+    # Si même les derniers tours débordent, on en résume davantage (on garde au moins 2 tours)
+    while cut < len(conv.history) - 2 and summary_cost + history_tokens(conv.history[cut:]) > budget:
+        cut += 1
+    old = conv.history[conv.summarized_upto:cut]
+    if not old:
+        return False
+
+    previous = summary_turns(conv.summary) if conv.summary else []
+    summary = summarize(previous + old)
+    if not summary:
+        return False
+    conv.set_summary(summary, cut)
+    return True
+
+
+def open_chat(model, history, agent, budget=None):
+    """ChatSession pour un agent : la vivante si on a une Conversation, sinon neuve et bornée.
+
+    Le budget est tenu AVANT l'envoi : une Conversation pas encore compactée
+    (page plus ancienne chargée, tours très longs) part dans une fenêtre bornée,
+    le temps que maybe_compact fasse glisser le résumé.
+    """
+    budget = budget if budget is not None else BUDGETS.get(agent)
+    if isinstance(history, Conversation):
+        if budget is None or history_tokens(history.context()) <= budget:
+            return history.chat(model)
+    return model.start_chat(history=window(history, agent, budget))
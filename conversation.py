@@ -0,0 +1,120 @@
+"""Conversation d'une session, tenue à jour tour par tour.
+
+Chaque tour est converti au format Gemini une seule fois, quand on l'ajoute.
+La ChatSession du Professeur reste vivante d'un rerun à l'autre : on ne lui
+transmet que les tours qui lui manquent.
+"""
+
+
+def to_gemini(role, content):
+    """Un message affiché/Firestore -> un tour au format Gemini."""
+    return {"role": "user" if role == "user" else "model", "parts": [content]}
+
+
+class Conversation:
+    """Messages affichés + historique Gemini d'une session, ajoutés ensemble."""
+
+    MAX_CHATS = 4  # ChatSessions gardées en vie (une par system prompt récent)
+
+    def __init__(self, session_id=None, messages=()):
+        self.session_id = session_id
+        self.messages = []         # {"role", "content"} : ce qu'on affiche et ce qu'on stocke
+        self.history = []          # {"role", "parts"} : tous les tours, au format Gemini
+        self.summary = None        # résumé glissant des vieux tours (voir context_window.py)
+        self.summarized_upto = 0   # les tours history[:summarized_upto] sont dans le résumé
+        self._chats = {}           # id(model) -> (model, ChatSession)
+        self.cursor = None         # timestamp du plus vieux message chargé (pagination)
+        self.has_more = False      # reste-t-il des messages plus anciens dans Firestore ?
+        for m in messages:
+            self.append(m["role"], m["content"])
+
+    def append(self, role, content):
+        self.messages.append({"role": role, "content": content})
+        self.history.append(to_gemini(role, content))
+
+    def prepend(self, messages):
+        """Ajoute des messages PLUS ANCIENS en tête (page précédente de l'historique)."""
+        if not messages:
+            return
+        self.messages[:0] = [{"role": m["role"], "content": m["content"]} for m in messages]
+        self.history[:0] = [to_gemini(m["role"], m["content"]) for m in messages]
+        if self.summary:
+            self.summarized_upto += len(messages)  # le résumé couvre toujours les mêmes tours
+        else:
+            self.reset_chats()  # le début du contexte a changé
+
+    def __len__(self):
+        return len(self.messages)
+
+    def context(self):
+        """Ce qu'on envoie vraiment : le résumé glissant puis les tours récents mot pour mot."""
+        recent = self.history[self.summarized_upto:]
+        if not self.summary:
+            return recent
+        return summary_turns(self.summary) + recent
+
+    def set_summary(self, summary, upto):
+        """Remplace les tours history[:upto] par `summary` dans le contexte envoyé."""
+        self.summary = summary
+        self.summarized_upto = upto
+        self.reset_chats()  # le début du contexte a changé : les ChatSessions repartent du résumé
+
+    def chat(self, model):
+        """ChatSession vivante pour `model`, rattrapée sur les tours qui lui manquent.
+
+        Le modèle vient du registre (même objet pour le même prompt), donc sa
+        ChatSession peut être réutilisée. Si elle a divergé (envoi interrompu,
+        historique réécrit), on la reconstruit.
+        """
+        entry = self._chats.get(id(model))
+        if entry is not None and entry[0] is model:
+            chat = entry[1]
+            try:
+                known = len(chat.history)
+            except Exception:
+                # Flux précédent pas consommé jusqu'au bout : état incertain
+                known = None
+            context = self.context()
+            if known is not None and known <= len(context):
+                chat.history.extend(context[known:])
+                return chat
+        chat = model.start_chat(history=self.context())
+        self._chats[id(model)] = (model, chat)
+        while len(self._chats) > self.MAX_CHATS:
+            self._chats.pop(next(iter(self._chats)))
+        return chat
+
+    def reset_chats(self):
+        """À appeler quand l'historique est réécrit (et plus seulement allongé)."""
+        self._chats.clear()
+
+
+def forget_extras(chat, question):
+    """Après la réponse : le dernier message envoyé redevient la question seule dans la ChatSession.
+
+    Les extraits du PDF (ou le brouillon du cache sémantique) ne servent qu'à
+    CETTE réponse ; restés dans `chat.history`, ils repartiraient à chaque tour
+    sans être comptés par la fenêtre de contexte.
+    """
+    try:
+        history = chat.history
+    except Exception:
+        return  # flux interrompu : Conversation.chat reconstruira la session
+    if len(history) >= 2:
+        history[-2] = to_gemini("user", question)
+
+
+def summary_turns(summary):
+    """Le résumé glissant, présenté à Gemini comme un échange (les rôles restent alternés)."""
+    return [
+        {"role": "user", "parts": [f"Résumé de notre échange jusqu'ici :\n{summary}"]},
+        {"role": "model", "parts": ["Compris, je reprends à partir de ce résumé."]},
+    ]
+
+
+def as_history(history):
+    """Accepte une Conversation (-> son contexte) ou une liste déjà au format Gemini."""
+    if isinstance(history, Conversation):
+        return history.context()
+    return history
+
@@ -0,0 +1,418 @@
+"""Faux backends Gemini et Firestore, en mémoire et sans réseau.
+
+Utilisés par benchmark.py (et utilisables pour des tests) : latence, quotas
+(429) et taille des réponses sont réglables, et chaque backend compte ses
+appels et les octets envoyés.
+
+    gemini = FakeGemini(latency=0.05, throttle_every=7)
+    model_registry.registry = ModelRegistry(factory=gemini.model, configure=gemini.configure)
+    db = FakeFirestore(latency=0.01)
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from google.api_core.exceptions import ResourceExhausted
+
+
+def _size(obj):
+    return len(json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def _text_of(contents):
+    if isinstance(contents, str):
+        return contents
+    parts = []
+    for turn in contents or []:
+        if isinstance(turn, dict):
+            parts.extend(str(p) for p in turn.get("parts", []))
+        else:
+            parts.append(str(turn))
+    return "\n".join(parts)
+
+
+# =========================================================
+# 🤖 FAUX GEMINI
+# =========================================================
+
+class FakeUsage:
+    def __init__(self, prompt_tokens, response_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = response_tokens
+        self.total_token_count = prompt_tokens + response_tokens
+
+
+class FakeResponse:
+    def __init__(self, text, usage=None, chunks=None):
+        self.text = text
+        self.usage_metadata = usage
+        self._chunks = chunks
+
+    def __iter__(self):
+        return iter(self._chunks if self._chunks is not None else [self])
+
+
+class FakeAsyncStream:
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    async def __aiter__(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(0)
+            yield chunk
+
+
+class FakeGemini:
+    """Backend factice : `model` a la signature de genai.GenerativeModel."""
+
+    def __init__(self, latency=0.05, ttft=None, response_chars=600, chunks=6,
+                 throttle_every=0, throttle_rate=0.0, seed=0, sleep=time.sleep):
+        self.latency = latency
+        self.ttft = latency / 3 if ttft is None else ttft
+        self.response_chars = response_chars
+        self.chunks = chunks
+        self.throttle_every = throttle_every
+        self.throttle_rate = throttle_rate
+        self._rng = random.Random(seed)
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.stats = defaultdict(int)
+
+    def configure(self, **kwargs):
+        self.stats["configure"] += 1
+
+    def model(self, model_name, system_instruction=None):
+        return FakeModel(self, model_name, system_instruction)
+
+    def _admit(self, system_instruction, contents):
+        """Compte l'appel et décide s'il est "throttlé" (comme un 429 de Google)."""
+        sent = len((system_instruction or "").encode("utf-8")) + len(_text_of(contents).encode("utf-8"))
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["bytes_sent"] += sent
+            n = self.stats["calls"]
+            throttled = (self.throttle_every and n % self.throttle_every == 0) or \
+                        (self.throttle_rate and self._rng.random() < self.throttle_rate)
+            if throttled:
+                self.stats["throttled"] += 1
+        if throttled:
+            raise ResourceExhausted("429 (faux backend)")
+        return (sent + 3) // 4
+
+    def _answer(self, prompt_tokens):
+        text = ("Réponse factice. " * (self.response_chars // 17 + 1))[:self.response_chars]
+        usage = FakeUsage(prompt_tokens, (len(text) + 3) // 4)
+        with self._lock:
+            self.stats["bytes_received"] += len(text.encode("utf-8"))
+            self.stats["prompt_tokens"] += usage.prompt_token_count
+            self.stats["response_tokens"] += usage.candidates_token_count
+        return text, usage
+
+    def _chunked(self, text, usage):
+        size = max(1, len(text) // self.chunks)
+        parts = [text[i:i + size] for i in range(0, len(text), size)]
+        return [FakeResponse(p, usage) for p in parts]
+
+    def generate(self, system_instruction, contents, stream=False):
+        tokens = self._admit(system_instruction, contents)
+        if not stream:
+            self._sleep(self.latency)
+            text, usage = self._answer(tokens)
+            return FakeResponse(text, usage)
+        self._sleep(self.ttft)
+        text, usage = self._answer(tokens)
+        chunks = self._chunked(text, usage)
+        gap = max(0.0, self.latency - self.ttft) / len(chunks)
+
+        def paced():
+            for i, chunk in enumerate(chunks):
+                if i:
+                    self._sleep(gap)
+                yield chunk
+        return FakeResponse(text, usage, chunks=paced())
+
+    async def generate_async(self, system_instruction, contents, stream=False):
+        tokens = self._admit(system_instruction, contents)
+        await asyncio.sleep(self.ttft if stream else self.latency)
+        text, usage = self._answer(tokens)
+        if stream:
+            return FakeAsyncStream(self._chunked(text, usage))
+        return FakeResponse(text, usage)
+
+
+class FakeModel:
+    def __init__(self, backend, model_name, system_instruction=None):
+        self.backend = backend
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+
+    def generate_content(self, contents, stream=False):
+        return self.backend.generate(self.system_instruction, contents, stream=stream)
+
+    async def generate_content_async(self, contents, stream=False):
+        return await self.backend.generate_async(self.system_instruction, contents, stream=stream)
+
+    def start_chat(self, history=None):
+        return FakeChat(self, history)
+
+
+class FakeChat:
+    def __init__(self, model, history=None):
+        self.model = model
+        self.history = list(history or [])
+
+    def _contents(self, prompt):
+        return self.history + [{"role": "user", "parts": [prompt]}]
+
+    def _record(self, prompt, text):
+        self.history += [{"role": "user", "parts": [prompt]}, {"role": "model", "parts": [text]}]
+
+    def send_message(self, prompt, stream=False):
+        response = self.model.generate_content(self._contents(prompt), stream=stream)
+        self._record(prompt, response.text)
+        return response
+
+    async def send_message_async(self, prompt, stream=False):
+        response = await self.model.generate_content_async(self._contents(prompt), stream=stream)
+        self._record(prompt, "".join(c.text for c in response._chunks) if stream else response.text)
+        return response
+
+
+class FakeContextBackend:
+    """Faux `caching.CachedContent` (voir context_cache.py) adossé à un FakeGemini.
+
+    Le préfixe mis en cache n'est plus compté dans les octets envoyés : seuls
+    la question et l'historique le sont, comme avec le vrai cache de Google.
+    """
+
+    def __init__(self, gemini, fail=False):
+        self.gemini = gemini
+        self.fail = fail
+        self.caches = {}  # nom -> (modèle, system_instruction, contents, ttl)
+        self.deleted = []
+
+    def create(self, api_key, model_name, system_instruction, contents, ttl):
+        if self.fail:
+            raise ResourceExhausted("création de cache refusée (faux backend)")
+        name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+        self.caches[name] = (model_name, system_instruction, contents, ttl)
+        self.gemini.stats["cache_created"] += 1
+        self.gemini.stats["bytes_sent"] += len(((system_instruction or "") + _text_of(contents)).encode("utf-8"))
+        return name
+
+    def model(self, name):
+        model_name, _, _, _ = self.caches[name]
+        return FakeModel(self.gemini, model_name, system_instruction=None)
+
+    def delete(self, name):
+        self.caches.pop(name, None)
+        self.deleted.append(name)
+
+
+# =========================================================
+# 🗄️ FAUX FIRESTORE
+# =========================================================
+
+class FakeFirestore:
+    """Sous-ensemble de google.cloud.firestore.Client utilisé par l'application."""
+
+    def __init__(self, latency=0.0, sleep=time.sleep):
+        self.latency = latency
+        self._sleep = sleep
+        self.data = defaultdict(dict)  # collection -> {id: document}
+        self.stats = defaultdict(int)
+        self._lock = threading.RLock()
+
+    def _round_trip(self, payload=None, reads=0, writes=0):
+        with self._lock:
+            self.stats["round_trips"] += 1
+            self.stats["reads"] += reads
+            self.stats["writes"] += writes
+            if payload is not None:
+                self.stats["bytes_sent"] += _size(payload)
+        if self.latency:
+            self._sleep(self.latency)
+
+    def _stamp(self, data):
+        # Sentinelles SERVER_TIMESTAMP (ou toute valeur non sérialisable) -> date du "serveur"
+        out = {}
+        for k, v in data.items():
+            if type(v).__name__ == "Sentinel":
+                v = datetime.now(timezone.utc)
+            out[k] = v
+        return out
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+class FakeSnapshot:
+    def __init__(self, ref, data):
+        self.reference = ref
+        self.id = ref.id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocRef:
+    def __init__(self, db, collection, doc_id=None):
+        self._db = db
+        self._collection = collection
+        self.id = doc_id or uuid.uuid4().hex
+
+    def _write(self, data):
+        with self._db._lock:
+            self._db.data[self._collection][self.id] = self._db._stamp(data)
+
+    def _update(self, fields):
+        with self._db._lock:
+            self._db.data[self._collection][self.id].update(self._db._stamp(fields))
+
+    def _delete(self):
+        with self._db._lock:
+            self._db.data[self._collection].pop(self.id, None)
+
+    def set(self, data):
+        self._db._round_trip(data, writes=1)
+        self._write(data)
+
+    def update(self, fields):
+        self._db._round_trip(fields, writes=1)
+        self._update(fields)
+
+    def delete(self):
+        self._db._round_trip(writes=1)
+        self._delete()
+
+    def get(self):
+        self._db._round_trip(reads=1)
+        return FakeSnapshot(self, self._db.data[self._collection].get(self.id))
+
+
+class FakeQuery:
+    def __init__(self, db, collection, filters=(), orders=(), cursor=None, limit=None):
+        self._db = db
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._cursor = cursor
+        self._limit = limit
+
+    def _with(self, **changes):
+        args = dict(filters=self._filters, orders=self._orders, cursor=self._cursor, limit=self._limit)
+        args.update(changes)
+        return FakeQuery(self._db, self._collection, **args)
+
+    def where(self, field, op, value):
+        return self._with(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._with(orders=self._orders + ((field, direction == "DESCENDING"),))
+
+    def start_after(self, values):
+        return self._with(cursor=values)
+
+    def limit(self, n):
+        return self._with(limit=n)
+
+    def select(self, fields):
+        return self
+
+    def _match(self, doc):
+        for field, op, value in self._filters:
+            if op == "==" and doc.get(field) != value:
+                return False
+            if op == "in" and doc.get(field) not in value:
+                return False
+        return True
+
+    def stream(self):
+        with self._db._lock:
+            items = [(i, d) for i, d in self._db.data[self._collection].items() if self._match(d)]
+        for field, desc in reversed(self._orders):
+            items = [it for it in items if field in it[1]]  # comme Firestore : champ absent = exclu
+            items.sort(key=lambda it: it[1][field], reverse=desc)
+        if self._cursor is not None and self._orders:
+            field, desc = self._orders[0]
+            pivot = self._cursor[field]
+            items = [it for it in items if (it[1][field] < pivot if desc else it[1][field] > pivot)]
+        if self._limit is not None:
+            items = items[:self._limit]
+        self._db._round_trip(reads=max(1, len(items)))
+        with self._db._lock:
+            self._db.stats["bytes_received"] += sum(_size(d) for _, d in items)
+        for doc_id, data in items:
+            yield FakeSnapshot(FakeDocRef(self._db, self._collection, doc_id), data)
+
+    def on_snapshot(self, callback):
+        """Listener minimal : un seul appel, avec les documents actuels (tous "ADDED")."""
+        docs = list(self.stream())
+        callback(docs, [FakeChange("ADDED", doc) for doc in docs], datetime.now(timezone.utc))
+        return FakeWatch()
+
+
+class FakeChange:
+    def __init__(self, type_name, document):
+        self.type = type("ChangeType", (), {"name": type_name})
+        self.document = document
+
+
+class FakeWatch:
+    def __init__(self):
+        self.active = True
+
+    def unsubscribe(self):
+        self.active = False
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, name):
+        super().__init__(db, name)
+
+    def document(self, doc_id=None):
+        return FakeDocRef(self._db, self._collection, doc_id)
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return datetime.now(timezone.utc), ref
+
+
+class FakeBatch:
+    """Les écritures ne partent qu'au commit, en un seul aller-retour."""
+
+    def __init__(self, db):
+        self._db = db
+        self._ops = []
+
+    def set(self, ref, data):
+        self._ops.append(("set", ref, data))
+
+    def update(self, ref, fields):
+        self._ops.append(("update", ref, fields))
+
+    def delete(self, ref):
+        self._ops.append(("delete", ref, None))
+
+    def commit(self):
+        payload = [data for _, _, data in self._ops if data is not None]
+        self._db._round_trip(payload, writes=len(self._ops))
+        for op, ref, data in self._ops:
+            if op == "set":
+                ref._write(data)
+            elif op == "update":
+                ref._update(data)
+            else:
+                ref._delete()
+        self._ops = []
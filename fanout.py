@@ -0,0 +1,28 @@
+"""Exécution en parallèle de plusieurs agents (ex: la "revue complète").
+
+Un pool de threads borné, partagé par tout le process : même avec beaucoup de
+sessions, on ne dépasse jamais MAX_WORKERS appels simultanés. Le limiteur de
+débit par clé (airbag.py) reste appliqué à chaque appel.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = 8
+
+_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="agents")
+
+
+def run_parallel(tasks, timeout=None):
+    """Lance `tasks` = [(nom, fonction sans argument), ...] en parallèle.
+
+    Renvoie [(nom, résultat, erreur)] dans l'ORDRE des tâches (pas dans l'ordre
+    d'arrivée), pour un affichage stable. Une tâche qui plante n'emporte pas
+    les autres : son erreur est renvoyée à sa place.
+    """
+    futures = [(name, _pool.submit(fn)) for name, fn in tasks]
+    results = []
+    for name, future in futures:
+        try:
+            results.append((name, future.result(timeout=timeout), None))
+        except Exception as e:
+            results.append((name, None, e))
+    return results
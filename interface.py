@@ -1,484 +1,532 @@
-import PyPDF2
-from google.cloud import firestore
-from google.oauth2 import service_account
-from google.api_core.exceptions import ResourceExhausted
-import google.generativeai as genai
-import json
-import uuid
-import super_prof
-import time
-
-# --- CONFIGURATION ---
-st.set_page_config(page_title="Super Prof - Cockpit", page_icon="🚀", layout="wide")
-# =========================================================
-# 🧠 PARTIE CERVEAU (LES IA) - INTÉGRÉE DIRECTEMENT ICI
-# =========================================================
-
-# Fonction de sécurité (AIRBAG) pour éviter le ResourceExhausted
-def ask_gemini_safe(model, prompt, is_chat=False, chat_session=None):
-    """Essaie de générer. Si Google dit STOP, on attend et on réessaie."""
-    try:
-        if is_chat:
-            return chat_session.send_message(prompt).text
-        else:
-            return model.generate_content(prompt).text
-    except ResourceExhausted:
-        time.sleep(10) # On fait une pause de 10 secondes
-        try:
-            # On réessaie une fois
-            if is_chat:
-                return chat_session.send_message(prompt).text
-            else:
-                return model.generate_content(prompt).text
-        except:
-            return "⚠️ Le système est surchargé. Attends 1 minute et réessaie."
-
-# 1. LE MANAGER
-def get_manager_plan(api_key, user_goal, pdf_text=""):
-    genai.configure(api_key=api_key)
-    system_prompt = "Tu es le Manager Pédagogique. Analyse la demande et fais un plan d'apprentissage numéroté et structuré. Ne donne pas le cours."
-    model = genai.GenerativeModel("models/gemini-1.5-flash", system_instruction=system_prompt)
-    prompt = f"Objectif : {user_goal}\n\nContexte PDF : {pdf_text[:10000]}..." 
-    return ask_gemini_safe(model, prompt)
-
-# 2. LE PROFESSEUR
-def get_professor_response(api_key, history, current_question, plan):
-    genai.configure(api_key=api_key)
-    system_prompt = f"Tu es un Professeur Expert. Ton plan à suivre est : {plan}. Sois pédagogue, clair, et procède étape par étape."
-    model = genai.GenerativeModel("models/gemini-1.5-flash", system_instruction=system_prompt)
-    chat = model.start_chat(history=history)
-    return ask_gemini_safe(model, current_question, is_chat=True, chat_session=chat)
-
-# 3. LE COACH
-def get_coach_advice(api_key, history):
-    genai.configure(api_key=api_key)
-    system_prompt = "Tu es le Coach Mental. Analyse la conversation. Donne un conseil méthodologique (ex: Pomodoro) et une phrase de motivation choc. Sois bref."
-    model = genai.GenerativeModel("models/gemini-1.5-flash", system_instruction=system_prompt)
-    chat = model.start_chat(history=history)
-    return ask_gemini_safe(model, "J'ai besoin de motivation.", is_chat=True, chat_session=chat)
-
-# 4. L'EXAMINATEUR
-def get_examiner_quiz(api_key, history):
-    genai.configure(api_key=api_key)
-    system_prompt = "Tu es l'Examinateur. Pose 3 questions (QCM ou pièges) sur ce qui vient d'être dit pour vérifier la compréhension. Ne donne pas la réponse tout de suite."
-    model = genai.GenerativeModel("models/gemini-1.5-flash", system_instruction=system_prompt)
-    chat = model.start_chat(history=history)
-    return ask_gemini_safe(model, "Teste-moi maintenant.", is_chat=True, chat_session=chat)
-
-# 5. LE SCRIBE
-def get_scribe_summary(api_key, history, mode="fiche"):
-    genai.configure(api_key=api_key)
-    if mode == "fusion":
-        system_prompt = "Tu es le Scribe. Fais un résumé dense de ce sous-module pour le dossier parent."
-    else:
-        system_prompt = "Tu es le Scribe. Crée une Fiche de Révision propre (Markdown) avec définitions et points clés."
-    
-    model = genai.GenerativeModel("models/gemini-1.5-flash", system_instruction=system_prompt)
-    chat = model.start_chat(history=history)
-    return ask_gemini_safe(model, "Fais le résumé demandé.", is_chat=True, chat_session=chat)
-
-
-# =========================================================
-# 🖥️ PARTIE INTERFACE (L'ÉCRAN)
-# =========================================================
-
-st.set_page_config(page_title="Super Prof - All in One", page_icon="🚀", layout="wide")
-
-# --- 1. DATABASE ---
-# --- DATABASE ---
-@st.cache_resource
-def get_db():
-    try:
-@@ -23,68 +96,53 @@ def get_db():
-
-db = get_db()
-
-# --- 2. STATE ---
-if "authenticated" not in st.session_state:
-    st.session_state.authenticated = False
-    st.session_state.username = ""
-if "current_session_id" not in st.session_state:
-    st.session_state.current_session_id = None
-# --- STATE ---
-if "authenticated" not in st.session_state: st.session_state.authenticated = False
-if "username" not in st.session_state: st.session_state.username = ""
-if "current_session_id" not in st.session_state: st.session_state.current_session_id = None
-
-# --- 3. FONCTIONS ---
-# --- FONCTIONS UTILITAIRES ---
-def get_all_sessions():
-    if db and st.session_state.username:
-        docs = db.collection("sessions")\
-                 .where("username", "==", st.session_state.username)\
-                 .order_by("created_at", direction=firestore.Query.DESCENDING)\
-                 .stream()
-        docs = db.collection("sessions").where("username", "==", st.session_state.username).order_by("created_at", direction=firestore.Query.DESCENDING).stream()
-        return [doc.to_dict() for doc in docs]
-    return []
-
-def create_session(titre, parent_id=None):
-    new_id = str(uuid.uuid4())
-    if db:
-        db.collection("sessions").document(new_id).set({
-            "session_id": new_id,
-            "username": st.session_state.username,
-            "title": titre,
-            "parent_id": parent_id,
-            "session_id": new_id, "username": st.session_state.username,
-            "title": titre, "parent_id": parent_id,
-            "created_at": firestore.SERVER_TIMESTAMP
-        })
-    return new_id
-
-def delete_session(session_id):
-    if db:
-        db.collection("sessions").document(session_id).delete()
-        if st.session_state.current_session_id == session_id:
-            st.session_state.current_session_id = None
-        if st.session_state.current_session_id == session_id: st.session_state.current_session_id = None
-
-def load_messages(session_id):
-    if db:
-        docs = db.collection("chat_history")\
-                 .where("session_id", "==", session_id)\
-                 .order_by("timestamp")\
-                 .stream()
-        docs = db.collection("chat_history").where("session_id", "==", session_id).order_by("timestamp").stream()
-        return [doc.to_dict() for doc in docs]
-    return []
-
-def save_msg(session_id, role, content):
-    if db:
-        db.collection("chat_history").add({
-            "session_id": session_id,
-            "username": st.session_state.username,
-            "role": role,
-            "content": content,
-            "timestamp": firestore.SERVER_TIMESTAMP
-            "session_id": session_id, "username": st.session_state.username,
-            "role": role, "content": content, "timestamp": firestore.SERVER_TIMESTAMP
-        })
-
-def get_session_info(session_id):
-    if db and session_id:
-        doc = db.collection("sessions").document(session_id).get()
-        if doc.exists:
-            return doc.to_dict()
-        if doc.exists: return doc.to_dict()
-    return None
-
-# --- 4. LOGIN ---
-# --- LOGIN ---
-if not st.session_state.authenticated:
-    st.title("🔐 Connexion")
-    with st.form("login"):
-@@ -97,200 +155,155 @@ def get_session_info(session_id):
-                st.rerun()
-    st.stop()
-
-# =========================================================
-# 🎮 BARRE LATÉRALE : LE COCKPIT DE PILOTAGE
-# =========================================================
-# --- SIDEBAR ---
-with st.sidebar:
-    st.title(f"👤 {st.session_state.username.capitalize()}")
-
-    # -----------------------------------------------------
-    # ZONE 1 : COMMANDES DE LA SESSION ACTIVE (Le plus important)
-    # -----------------------------------------------------
-    # ZONE OUTILS
-    if st.session_state.current_session_id:
-        # Récup info session active
-        curr_info = get_session_info(st.session_state.current_session_id)
-        parent_id = curr_info.get("parent_id")
-        
-        st.markdown("### 🕹️ Commandes")
-        
-        # A. LES SPÉCIALISTES (Boutons d'accès rapide)
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            if st.button("😈", help="Quiz Express"):
-                st.session_state.special_trigger = "quiz"
-        with col2:
-            if st.button("📣", help="Conseil Coach"):
-                st.session_state.special_trigger = "coach"
-        with col3:
-            if st.button("📝", help="Fiche Révision"):
-                st.session_state.special_trigger = "fiche"
-        
-        st.divider()
-
-        # B. GESTION ARBRE (Créer sous-dossier / Fusionner)
-        st.markdown(f"**Dossier Actif :** `{curr_info['title']}`")
-        
-        # 1. Créer un sous-dossier (Directement ici)
-        with st.expander("↪️ Créer Sous-Chapitre", expanded=False):
-            sub_name = st.text_input("Titre du sous-dossier", key="input_sub")
-            if st.button("Créer & Basculer"):
-                if sub_name:
-                    child_id = create_session(sub_name, parent_id=st.session_state.current_session_id)
-                    st.session_state.current_session_id = child_id
-        st.subheader("🕹️ Commandes")
-        c1, c2, c3 = st.columns(3)
-        with c1:
-            if st.button("😈", help="Quiz"): st.session_state.special_trigger = "quiz"
-        with c2:
-            if st.button("📣", help="Coach"): st.session_state.special_trigger = "coach"
-        with c3:
-            if st.button("📝", help="Fiche"): st.session_state.special_trigger = "fiche"
-            
-        # GESTION ARBRE
-        curr = get_session_info(st.session_state.current_session_id)
-        if curr:
-            st.caption(f"Actif : {curr['title']}")
-            with st.expander("↪️ Sous-Dossier"):
-                sub = st.text_input("Titre", key="sub_in")
-                if st.button("Créer") and sub:
-                    cid = create_session(sub, parent_id=st.session_state.current_session_id)
-                    st.session_state.current_session_id = cid
-                    st.session_state.messages = []
-                    st.session_state.plan_du_manager = None
-                    st.rerun()
-            if curr.get("parent_id"):
-                if st.button("⬆️ FUSIONNER", type="primary"):
-                    st.session_state.trigger_fusion = True
-                    st.rerun()
-
-        # 2. Fusionner vers le parent (Si on est dans un sous-dossier)
-        if parent_id:
-            st.warning("⚠️ Terminer ce chapitre ?")
-            if st.button("⬆️ FUSIONNER VERS PARENT", type="primary"):
-                # Logique de fusion (Déclenchée via un flag pour l'exécuter dans le main script)
-                st.session_state.trigger_fusion = True
-                st.rerun()
-    
-    st.divider()
-
-    # -----------------------------------------------------
-    # ZONE 2 : NAVIGATION (L'ARBRE)
-    # -----------------------------------------------------
-    st.subheader("🗂️ Navigateur")
-
-    # Bouton Nouvelle Racine (Gros projet)
-    with st.expander("➕ Nouveau Projet (Racine)"):
-        root_title = st.text_input("Titre Projet")
-        if st.button("Créer Projet") and root_title:
-            sess_id = create_session(root_title, parent_id=None)
-            st.session_state.current_session_id = sess_id
-    # NAVIGATION ARBRE
-    st.subheader("🗂️ Mes Dossiers")
-    with st.expander("➕ Nouveau Projet"):
-        rt = st.text_input("Titre")
-        if st.button("Créer Racine") and rt:
-            sid = create_session(rt)
-            st.session_state.current_session_id = sid
-            st.session_state.messages = []
-            st.session_state.plan_du_manager = None
-            st.rerun()
-
-    # Affichage de l'arbre
-    all_sessions = get_all_sessions()
-    roots = []
-    children_map = {}
-    for s in all_sessions:
-        if not s.get("parent_id"): roots.append(s)
-        else:
-            pid = s["parent_id"]
-            if pid not in children_map: children_map[pid] = []
-            children_map[pid].append(s)
-            
-    def display_tree(session_list, level=0):
-        for s in session_list:
-            indent = "⠀" * (level*2) 
-            icon = "📂" if level == 0 else "↳"
-            title_display = f"{indent}{icon} {s['title']}"
-
-            # Highlight visuel
-            if s['session_id'] == st.session_state.current_session_id:
-                title_display = f"🔴 **{s['title']}**"
-    # Affichage Arbre
-    sessions = get_all_sessions()
-    roots = [s for s in sessions if not s.get("parent_id")]
-    children = {}
-    for s in sessions:
-        pid = s.get("parent_id")
-        if pid:
-            if pid not in children: children[pid] = []
-            children[pid].append(s)
-
-            c1, c2 = st.columns([5, 1])
-    def show_tree(lst, level=0):
-        for s in lst:
-            pre = "⠀" * (level*2) + ("📂" if level==0 else "↳")
-            label = f"{pre} {s['title']}"
-            if s['session_id'] == st.session_state.current_session_id: label = f"🔴 **{s['title']}**"
-            
-            c1, c2 = st.columns([5,1])
-            with c1:
-                if st.button(title_display, key=f"nav_{s['session_id']}"):
-                if st.button(label, key=f"n_{s['session_id']}"):
-                    st.session_state.current_session_id = s['session_id']
-                    st.session_state.messages = load_messages(s['session_id'])
-                    st.session_state.plan_du_manager = None
-                    st.rerun()
-            with c2:
-                if st.button("x", key=f"del_{s['session_id']}"):
-                if st.button("x", key=f"d_{s['session_id']}"):
-                    delete_session(s['session_id'])
-                    st.rerun()
-            
-            if s['session_id'] in children_map:
-                display_tree(children_map[s['session_id']], level + 1)
-            if s['session_id'] in children: show_tree(children[s['session_id']], level+1)
-
-    display_tree(roots)
-
-
-# =========================================================
-# 🖥️ ZONE PRINCIPALE : LE CHAT
-# =========================================================
-    show_tree(roots)
-
-# --- MAIN AREA ---
-if not st.session_state.current_session_id:
-    st.info("👈 Sélectionne un dossier à gauche ou crée un nouveau projet.")
-    st.info("👈 Choisis un dossier.")
-    st.stop()
-
-# Infos session active
-current_info = get_session_info(st.session_state.current_session_id)
-if not current_info: st.stop() # Sécurité si supprimé
-parent_id = current_info.get("parent_id")
-
-# Titre simple
-st.title(current_info['title'])
-curr_info = get_session_info(st.session_state.current_session_id)
-if not curr_info: st.stop()
-st.title(curr_info['title'])
-
-# --- LOGIQUE DE FUSION (Déclenchée depuis la Sidebar) ---
-# LOGIQUE DE FUSION
-if st.session_state.get("trigger_fusion"):
-    with st.spinner("🚀 Le Scribe compile et fusionne vers le parent..."):
-        # 1. On récupère l'historique
-        hist_gemini = [{"role": ("user" if m["role"]=="user" else "model"), "parts": [m["content"]]} for m in st.session_state.messages]
-        # 2. On appelle le Scribe
-        resume = super_prof.get_scribe_summary(st.secrets["GOOGLE_API_KEY"], hist_gemini, mode="fusion")
-        # 3. On poste dans le Parent
-        msg_fusion = f"✅ **MODULE TERMINÉ : {current_info['title']}**\n\n📌 *Résumé des acquis :*\n{resume}"
-        save_msg(parent_id, "assistant", msg_fusion)
-        # 4. On switch
-        st.session_state.current_session_id = parent_id
-        st.session_state.messages = load_messages(parent_id)
-        st.session_state.trigger_fusion = False # Reset flag
-    with st.spinner("Fusion en cours..."):
-        hist = [{"role": ("user" if m["role"]=="user" else "model"), "parts": [m["content"]]} for m in st.session_state.messages]
-        # APPEL FONCTION INTERNE
-        res = get_scribe_summary(st.secrets["GOOGLE_API_KEY"], hist, mode="fusion")
-        save_msg(curr_info['parent_id'], "assistant", f"✅ **RÉSUMÉ {curr_info['title']}**\n{res}")
-        st.session_state.current_session_id = curr_info['parent_id']
-        st.session_state.messages = load_messages(curr_info['parent_id'])
-        st.session_state.trigger_fusion = False
-        st.rerun()
-
-# --- LOGIQUE DES SPÉCIALISTES (Déclenchée depuis la Sidebar) ---
-# LOGIQUE SPÉCIALE (COACH/QUIZ)
-if st.session_state.get("special_trigger"):
-    trigger = st.session_state.special_trigger
-    hist_gemini = [{"role": ("user" if m["role"]=="user" else "model"), "parts": [m["content"]]} for m in st.session_state.messages]
-    
-    resp_spec = ""
-    prefix = ""
-    with st.spinner(f"Appel de l'agent {trigger}..."):
-        if trigger == "quiz":
-            resp_spec = super_prof.get_examiner_quiz(st.secrets["GOOGLE_API_KEY"], hist_gemini)
-            prefix = "😈 **EXAMINATEUR**"
-        elif trigger == "fiche":
-            resp_spec = super_prof.get_scribe_summary(st.secrets["GOOGLE_API_KEY"], hist_gemini, mode="fiche")
-            prefix = "📝 **SCRIBE**"
-        elif trigger == "coach":
-            resp_spec = super_prof.get_coach_advice(st.secrets["GOOGLE_API_KEY"], hist_gemini)
-            prefix = "📣 **COACH**"
-    trig = st.session_state.special_trigger
-    hist = [{"role": ("user" if m["role"]=="user" else "model"), "parts": [m["content"]]} for m in st.session_state.messages]
-    with st.spinner(f"Appel {trig}..."):
-        if trig == "quiz": 
-            # APPEL DIRECT
-            r = get_examiner_quiz(st.secrets["GOOGLE_API_KEY"], hist)
-            p = "😈 **EXAMINATEUR**"
-        elif trig == "coach": 
-            # APPEL DIRECT
-            r = get_coach_advice(st.secrets["GOOGLE_API_KEY"], hist)
-            p = "📣 **COACH**"
-        elif trig == "fiche": 
-            # APPEL DIRECT
-            r = get_scribe_summary(st.secrets["GOOGLE_API_KEY"], hist, mode="fiche")
-            p = "📝 **SCRIBE**"
-
-    full_resp = f"### {prefix}\n{resp_spec}"
-    st.session_state.messages.append({"role": "assistant", "content": full_resp})
-    save_msg(st.session_state.current_session_id, "assistant", full_resp)
-    st.session_state.special_trigger = None # Reset
-    full = f"### {p}\n{r}"
-    st.session_state.messages.append({"role": "assistant", "content": full})
-    save_msg(st.session_state.current_session_id, "assistant", full)
-    st.session_state.special_trigger = None
-    st.rerun()
-
-# --- AFFICHAGE CHAT ---
-uploaded_file = st.file_uploader("📎 Ajouter un PDF (Contexte)", type="pdf")
-pdf_text = ""
-if uploaded_file:
-    reader = PyPDF2.PdfReader(uploaded_file)
-    for page in reader.pages: pdf_text += page.extract_text()
-
-for msg in st.session_state.messages:
-    with st.chat_message(msg["role"]):
-        st.markdown(msg["content"])
-# CHAT
-up = st.file_uploader("PDF", type="pdf")
-pdf_txt = ""
-if up:
-    read = PyPDF2.PdfReader(up)
-    for p in read.pages: pdf_txt += p.extract_text()
-
-# --- INPUT UTILISATEUR ---
-if user_input := st.chat_input("Discute avec le Professeur..."):
-    # User
-    st.session_state.messages.append({"role": "user", "content": user_input})
-    save_msg(st.session_state.current_session_id, "user", user_input)
-    with st.chat_message("user"): st.write(user_input)
-for m in st.session_state.messages:
-    with st.chat_message(m["role"]): st.markdown(m["content"])
-
-    # IA Logic
-    if len(st.session_state.messages) <= 1 and not st.session_state.plan_du_manager and not parent_id:
-        with st.spinner("Le Manager prépare le plan..."):
-            resp = super_prof.get_manager_plan(st.secrets["GOOGLE_API_KEY"], user_input, pdf_text)
-if txt := st.chat_input("..."):
-    st.session_state.messages.append({"role": "user", "content": txt})
-    save_msg(st.session_state.current_session_id, "user", txt)
-    with st.chat_message("user"): st.write(txt)
-    
-    # IA REPONSE
-    if len(st.session_state.messages) <= 1 and not st.session_state.plan_du_manager and not curr_info.get("parent_id"):
-        with st.spinner("Manager..."):
-            # APPEL DIRECT
-            resp = get_manager_plan(st.secrets["GOOGLE_API_KEY"], txt, pdf_txt)
-            st.session_state.plan_du_manager = resp
-    else:
-        with st.spinner("Le Professeur réfléchit..."):
-            hist = [{"role": ("user" if m["role"]=="user" else "model"), "parts": [m["content"]]} for m in st.session_state.messages[:-1]]
-            context = st.session_state.plan_du_manager if st.session_state.plan_du_manager else "Contexte libre."
-            resp = super_prof.get_professor_response(st.secrets["GOOGLE_API_KEY"], hist, user_input, context)
-
-    # Reponse IA
-        with st.spinner("Professeur..."):
-            h = [{"role": ("user" if m["role"]=="user" else "model"), "parts": [m["content"]]} for m in st.session_state.messages[:-1]]
-            c = st.session_state.plan_du_manager if st.session_state.plan_du_manager else "Contexte libre"
-            # APPEL DIRECT
-            resp = get_professor_response(st.secrets["GOOGLE_API_KEY"], h, txt, c)
-            
-    st.session_state.messages.append({"role": "assistant", "content": resp})
-    save_msg(st.session_state.current_session_id, "assistant", resp)
-    with st.chat_message("assistant"): st.write(resp)
+import streamlit as st
+# Pas de SDK Google (gRPC compris), ni de NumPy, avant le login : chargés au premier besoin (démarrage à froid)
+import itertools
+import json
+import uuid
+import response_cache
+from conversation import Conversation
+import context_window
+from pdf_cache import PdfCache, file_hash, join_pages
+from write_buffer import WriteBuffer
+from session_tree import SessionTree, TreeCache
+from session_ops import delete_subtree, fuse_subtree, read_history, subtree_ids
+import storage
+from jobs import DONE, FAILED, JobQueue
+import metrics
+from datetime import datetime, timezone
+
+# --- CONFIGURATION ---
+st.set_page_config(page_title="Super Prof - All in One", page_icon="🚀", layout="wide")
+
+# =========================================================
+# 🖥️ PARTIE INTERFACE (L'ÉCRAN)
+# =========================================================
+
+# --- DATABASE ---
+@st.cache_resource
+def get_db():
+    try:
+        from google.cloud import firestore
+        from google.oauth2 import service_account
+        key_dict = json.loads(st.secrets["textkey"])
+        creds = service_account.Credentials.from_service_account_info(key_dict)
+        return firestore.Client(credentials=creds, project=key_dict["project_id"])
+    except Exception as e:
+        st.error(f"Base de données indisponible : {e}")
+        return None
+
+@st.cache_resource
+def start_metrics_endpoint(port):
+    return metrics.serve(port)  # un seul serveur pour le process, malgré les reruns
+
+# --- STATE ---
+if "authenticated" not in st.session_state: st.session_state.authenticated = False
+if "username" not in st.session_state: st.session_state.username = ""
+if "current_session_id" not in st.session_state: st.session_state.current_session_id = None
+if "conv" not in st.session_state: st.session_state.conv = Conversation()
+
+# --- FONCTIONS UTILITAIRES ---
+@st.cache_resource
+def get_session_trees():
+    """Arbres des sessions par utilisateur (partagés par ses onglets) : une lecture, puis on_snapshot.
+
+    Bornés (MAX_ARBRES, INACTIVITE) : un arbre évincé ferme son listener.
+    """
+    return TreeCache(lambda username: SessionTree.live(db, username))
+
+def get_tree():
+    if db and st.session_state.username:
+        return get_session_trees().get(st.session_state.username)
+    return SessionTree()
+
+@metrics.timed("firestore", "create_session")
+def create_session(titre, parent_id=None):
+    new_id = str(uuid.uuid4())
+    if db:
+        from google.cloud.firestore import SERVER_TIMESTAMP
+        doc = {
+            "session_id": new_id, "username": st.session_state.username,
+            "title": titre, "parent_id": parent_id,
+        }
+        db.collection("sessions").document(new_id).set(dict(doc, created_at=SERVER_TIMESTAMP))
+        get_tree().add(dict(doc, created_at=datetime.now(timezone.utc)))  # visible sans relire la collection
+    return new_id
+
+@metrics.timed("firestore", "delete_session")
+def delete_session(session_id):
+    """Suppression EN CASCADE : sous-dossiers + tous leurs messages, par batches, avec progression."""
+    if db:
+        flush_messages()  # sinon des messages en attente réapparaîtraient orphelins après coup
+        barre = st.progress(0.0, text="Suppression...")
+        ids = delete_subtree(db, get_tree(), session_id,
+                             progress=lambda fait, total: barre.progress(fait / total, text=f"Suppression... {fait}/{total}"))
+        barre.empty()
+        if st.session_state.current_session_id in ids: st.session_state.current_session_id = None
+
+def get_write_buffer():
+    """Tampon d'écriture de la session Streamlit (un batch Firestore au lieu d'un add par message)."""
+    if "write_buffer" not in st.session_state:
+        st.session_state.write_buffer = WriteBuffer(db)
+    return st.session_state.write_buffer
+
+def flush_messages():
+    if db and "write_buffer" in st.session_state:
+        st.session_state.write_buffer.flush()
+
+PAGE_MESSAGES = 50    # messages chargés à l'ouverture d'une session, puis par page
+FENETRE_AFFICHAGE = 30  # messages rendus à l'écran (les autres : bouton "plus ancien")
+
+def load_messages(session_id, limit=PAGE_MESSAGES, before=None):
+    """Les `limit` derniers messages (avant le curseur `before`), du plus ancien au plus récent."""
+    if db:
+        flush_messages()  # on relit ce qu'on vient d'écrire : le tampon part d'abord
+        return storage.load_messages(db, session_id, limit, before)
+    return []
+
+def open_conversation(session_id):
+    """Ouvre une session : seulement la dernière page de messages, le reste à la demande."""
+    msgs = load_messages(session_id)
+    conv = Conversation(session_id, msgs)
+    conv.cursor = msgs[0]["timestamp"] if msgs else None
+    conv.has_more = len(msgs) == PAGE_MESSAGES
+    st.session_state.fenetre = FENETRE_AFFICHAGE
+    return conv
+
+def load_older(conv):
+    """Page précédente (curseur start_after sur timestamp), ajoutée en tête de la conversation."""
+    msgs = load_messages(conv.session_id, before=conv.cursor)
+    conv.prepend(msgs)
+    if msgs: conv.cursor = msgs[0]["timestamp"]
+    conv.has_more = len(msgs) == PAGE_MESSAGES
+
+def save_msg(session_id, role, content, username=None, buffer=None):
+    """`username`/`buffer` explicites : appel hors du script (tâches de fond), sans st.session_state."""
+    if db:
+        # Horodatage posé par le tampon (strictement croissant : l'ordre survit au batch)
+        if buffer is None:  # pas `or` : un tampon vide est faux (__len__ == 0)
+            buffer = get_write_buffer()
+        buffer.add(storage.message_doc(session_id, username or st.session_state.username, role, content))
+
+def get_session_info(session_id):
+    if db and session_id:
+        tree = get_tree()
+        if session_id in tree: return tree.get(session_id)  # servi par le cache, 0 lecture (pas mesuré)
+        with metrics.track("firestore", "get_session_info"):
+            doc = db.collection("sessions").document(session_id).get()
+        if doc.exists:
+            tree.add(doc.to_dict())
+            return doc.to_dict()
+    return None
+
+def save_plan(session_id, plan, pdf_hash=None, objectif=None):
+    """Plan du Manager + sommaire + hash du PDF sur le document de la session (et dans l'arbre en cache)."""
+    if db and plan and MSG_SURCHARGE not in plan:
+        get_tree().update(session_id, **storage.save_plan(db, session_id, plan, pdf_hash, objectif))
+
+def resumer_contexte(history):
+    """Résumé glissant des vieux tours : on réutilise le prompt "fusion" du Scribe."""
+    return get_scribe_summary(st.secrets["GOOGLE_API_KEY"], history, mode="fusion", fallback="") or None
+
+# --- TÂCHES DE FOND (fusions, fiches, lecture de PDF) ---
+LIBELLES_JOBS = {"fusion": "Fusion", "fusion_arbre": "Fusion du sous-arbre", "fiche": "Fiche de révision", "pdf": "Lecture du PDF"}
+LIVRENT_DES_MESSAGES = ("fusion", "fusion_arbre", "fiche")  # à la fin, la conversation est à relire
+
+@st.cache_resource
+def get_jobs():
+    """File de tâches du process (SQLite) : le travail survit aux reruns et aux clics."""
+    cle = st.secrets["GOOGLE_API_KEY"]  # lue ici : les handlers tournent dans des threads
+    queue = JobQueue(st.secrets.get("JOBS_DB", ".cache/jobs.sqlite"))
+    sortie = WriteBuffer(db, interval=0)  # tampon des résultats, partagé par les workers
+
+    from google.api_core.exceptions import ResourceExhausted  # gRPC : seulement quand la file démarre
+
+    def resumer(history, mode):
+        res = get_scribe_summary(cle, history, mode=mode)  # quota épuisé : l'exception remonte, le job sera retenté
+        if not res:
+            raise ResourceExhausted("Scribe indisponible")  # le job sera retenté
+        return res
+
+    def fusion(session_id, parent_id, title, username):
+        return [[parent_id, title, resumer(read_history(db, session_id), "fusion")]]
+
+    def fusion_arbre(root_id, username):
+        return fuse_subtree(SessionTree.load(db, username), root_id,
+                            load_history=lambda sid: read_history(db, sid),
+                            summarize=lambda h: resumer(h, "fusion"))
+
+    def fiche(session_id, username):
+        return signed("fiche", resumer(read_history(db, session_id), "fiche"))
+
+    def livrer_resumes(job, resultats):
+        for parent_id, titre, res in resultats:
+            save_msg(parent_id, "assistant", f"✅ **RÉSUMÉ {titre}**\n{res}", job["payload"]["username"], sortie)
+        sortie.flush()
+
+    def livrer_fiche(job, texte):
+        save_msg(job["session_id"], "assistant", texte, job["payload"]["username"], sortie)
+        sortie.flush()
+
+    queue.register("fusion", fusion, livrer_resumes)
+    queue.register("fusion_arbre", fusion_arbre, livrer_resumes)
+    queue.register("fiche", fiche, livrer_fiche)
+    queue.register("pdf", lambda path, sha: PdfCache().extract(path, sha))
+    queue.resume()  # reprend ce qu'un process précédent avait laissé en cours
+    return queue
+
+def lancer_job(kind, payload, session_id, key):
+    """Soumet une tâche (idempotente via `key`) et la suit depuis cette session Streamlit ; renvoie le job.
+
+    Une clé déjà terminée renvoie le job DONE sans le suivre : son résultat est
+    déjà livré, le suivre ne ferait que recharger la conversation.
+    """
+    flush_messages()  # le job relit l'historique dans Firestore
+    job_id = get_jobs().submit(kind, dict(payload, username=st.session_state.username), session_id=session_id, key=key)
+    job = get_jobs().get(job_id)
+    if job["status"] != DONE:
+        st.session_state.setdefault("jobs_suivis", {})[job_id] = session_id
+    return job
+
+@st.fragment(run_every=2)
+def suivi_jobs():
+    """Statut des tâches lancées d'ici ; quand l'une finit, on rafraîchit la page.
+
+    La conversation n'est relue que si la tâche y a écrit des messages : sinon
+    (lecture de PDF) on garde le résumé glissant et les ChatSessions vivantes.
+    """
+    suivis = st.session_state.get("jobs_suivis", {})
+    fini = recharger = False
+    for job_id, session_id in list(suivis.items()):
+        job = get_jobs().get(job_id)
+        if job is None or job["status"] in (DONE, FAILED):
+            suivis.pop(job_id)
+            if job is not None and job["status"] == FAILED:
+                st.session_state.job_erreur = f"⚠️ {LIBELLES_JOBS.get(job['kind'], job['kind'])} : échec ({job['error']})"
+                if job["kind"] == "pdf":
+                    st.session_state.pdf_illisible = job["payload"]["sha"]  # pas de relance à chaque rerun
+                    PdfCache().unstash(job["payload"]["sha"])
+            if session_id == st.session_state.current_session_id:
+                fini = True
+                recharger = recharger or (job is not None and job["kind"] in LIVRENT_DES_MESSAGES)
+            continue
+        essai = f" (essai {job['attempts']})" if job["attempts"] > 1 else ""
+        st.caption(f"⏳ {LIBELLES_JOBS.get(job['kind'], job['kind'])} en arrière-plan...{essai}")
+    if fini:
+        if recharger: st.session_state.conv = open_conversation(st.session_state.current_session_id)
+        st.rerun()
+
+def afficher_stream(chunks, attente="...", entete=""):
+    """Affiche la réponse dans une bulle assistant au fil de l'eau et renvoie le texte complet.
+
+    Le spinner ne reste visible que jusqu'au premier morceau (time-to-first-token) ;
+    `entete` (ex: le nom de l'agent) est affiché avec ce premier morceau.
+    """
+    with st.chat_message("assistant"):
+        with st.spinner(attente):
+            premier = next(chunks, "")
+        return st.write_stream(itertools.chain([entete, premier], chunks))
+
+# --- LOGIN ---
+if not st.session_state.authenticated:
+    st.title("🔐 Connexion")
+    with st.form("login"):
+        user = st.text_input("Pseudo")
+        if st.form_submit_button("Entrer"):
+            if user:
+                st.session_state.authenticated = True
+                st.session_state.username = user.strip().lower()
+                st.rerun()
+    st.stop()
+
+# --- INITIALISATION DIFFÉRÉE ---
+# Après le login seulement : l'écran de connexion s'affiche sans client Firestore ni SDK Gemini
+db = get_db()
+
+# Les agents (prompts, modèles, budgets, caches, airbag) sont déclarés une seule fois dans agents.py.
+# Importés ici, pas en tête : airbag charge google.api_core (et gRPC).
+import airbag
+from agents import MSG_SURCHARGE, signed
+from super_prof import get_coach_advice, get_examiner_quiz, get_full_review, get_manager_plan, get_professor_response, get_scribe_summary
+
+# Quota Gemini de la clé (requêtes/minute), partagé par toutes les sessions du serveur : 15 au palier gratuit
+airbag.get_limiter(st.secrets["GOOGLE_API_KEY"], rpm=int(st.secrets.get("GEMINI_RPM", airbag.RPM_PAR_DEFAUT)))
+
+# Étage disque du cache de réponses (partagé par toutes les sessions du serveur)
+response_cache.enable_disk(st.secrets.get("RESPONSE_CACHE_DB", ".cache/reponses.sqlite"))
+
+# Métriques : une ligne JSON par appel sur stderr, et un endpoint /metrics (Prometheus) si METRICS_PORT est configuré
+metrics.enable_json_logs()
+if st.secrets.get("METRICS_PORT"):
+    start_metrics_endpoint(int(st.secrets["METRICS_PORT"]))
+
+# --- SIDEBAR ---
+with st.sidebar:
+    st.title(f"👤 {st.session_state.username.capitalize()}")
+
+    # ZONE OUTILS
+    if st.session_state.current_session_id:
+        st.subheader("🕹️ Commandes")
+        c1, c2, c3, c4 = st.columns(4)
+        with c1:
+            if st.button("😈", help="Quiz"): st.session_state.special_trigger = "quiz"
+        with c2:
+            if st.button("📣", help="Coach"): st.session_state.special_trigger = "coach"
+        with c3:
+            if st.button("📝", help="Fiche"): st.session_state.special_trigger = "fiche"
+        with c4:
+            if st.button("🧩", help="Revue complète (Quiz + Coach + Fiche)"): st.session_state.special_trigger = "revue"
+
+        # GESTION ARBRE
+        curr = get_session_info(st.session_state.current_session_id)
+        if curr:
+            st.caption(f"Actif : {curr['title']}")
+            porteur = storage.plan_of(get_tree(), st.session_state.current_session_id)
+            if porteur and porteur.get("outline"):
+                with st.expander("🧭 Plan" + ("" if porteur is curr else f" (hérité de {porteur['title']})")):
+                    st.markdown("\n".join(f"- {ligne}" for ligne in porteur["outline"]))
+            with st.expander("↪️ Sous-Dossier"):
+                sub = st.text_input("Titre", key="sub_in")
+                if st.button("Créer") and sub:
+                    cid = create_session(sub, parent_id=st.session_state.current_session_id)
+                    flush_messages()  # changement de session : le tampon part
+                    st.session_state.current_session_id = cid
+                    st.session_state.conv = Conversation(cid)
+                    st.rerun()
+            if curr.get("parent_id"):
+                if st.button("⬆️ FUSIONNER", type="primary"):
+                    st.session_state.trigger_fusion = True
+                    st.rerun()
+            if get_tree().children(st.session_state.current_session_id):
+                if st.button("🌳 Fusionner tout le sous-arbre", help="Résume les sous-dossiers des feuilles vers ce dossier"):
+                    st.session_state.trigger_fusion_arbre = True
+                    st.rerun()
+
+    st.divider()
+    # NAVIGATION ARBRE
+    st.subheader("🗂️ Mes Dossiers")
+    with st.expander("➕ Nouveau Projet"):
+        rt = st.text_input("Titre")
+        if st.button("Créer Racine") and rt:
+            sid = create_session(rt)
+            flush_messages()
+            st.session_state.current_session_id = sid
+            st.session_state.conv = Conversation(sid)
+            st.rerun()
+
+    # Affichage Arbre
+    tree = get_tree()
+
+    def show_tree(lst, level=0):
+        for s in lst:
+            pre = "⠀" * (level*2) + ("📂" if level==0 else "↳")
+            label = f"{pre} {s['title']}"
+            if s['session_id'] == st.session_state.current_session_id: label = f"🔴 **{s['title']}**"
+
+            c1, c2 = st.columns([5,1])
+            with c1:
+                if st.button(label, key=f"n_{s['session_id']}"):
+                    st.session_state.current_session_id = s['session_id']
+                    st.session_state.conv = open_conversation(s['session_id'])
+                    st.rerun()
+            with c2:
+                if st.button("x", key=f"x_{s['session_id']}", help="Supprimer (avec les sous-dossiers)"):
+                    st.session_state.a_supprimer = s['session_id']
+                    st.rerun()
+            if st.session_state.get("a_supprimer") == s['session_id']:
+                # Suppression en cascade : on montre ce qui va partir (sous-arbre parcouru pour CETTE ligne seulement)
+                n = len(subtree_ids(tree, s['session_id']))
+                st.warning(f"Supprimer « {s['title']} » : {n} dossier{'s' if n > 1 else ''} et tous leurs messages ?")
+                ok, annuler = st.columns(2)
+                if ok.button("Confirmer", key=f"d_{s['session_id']}", type="primary"):
+                    st.session_state.a_supprimer = None
+                    delete_session(s['session_id'])
+                    st.rerun()
+                if annuler.button("Annuler", key=f"a_{s['session_id']}"):
+                    st.session_state.a_supprimer = None
+                    st.rerun()
+            show_tree(tree.children(s['session_id']), level+1)
+
+    show_tree(tree.roots())
+
+    # PANNEAU ADMIN (comptes listés dans le secret ADMINS) : où part le temps, et combien de tokens
+    if st.session_state.username in st.secrets.get("ADMINS", []):
+        st.divider()
+        with st.expander("📊 Admin : métriques"):
+            lignes = metrics.metrics.snapshot()
+            if lignes: st.dataframe(lignes, hide_index=True, use_container_width=True)
+            else: st.caption("Aucun appel mesuré pour l'instant.")
+            cs = response_cache.cache.stats()
+            st.caption(f"Cache de réponses : {cs['hits']} hits / {cs['misses']} misses ({cs['hit_rate']:.0%})")
+            import semantic_cache  # NumPy : seulement pour ce panneau
+            ss = semantic_cache.cache.stats()
+            st.caption(f"Cache sémantique : {ss['hits']} hits, {ss['drafts']} brouillons, {ss['misses']} misses ({ss['entries']} questions)")
+            st.download_button("⬇️ Export Prometheus", metrics.metrics.prometheus_text(), file_name="metrics.txt")
+
+# --- MAIN AREA ---
+if not st.session_state.current_session_id:
+    st.info("👈 Choisis un dossier.")
+    st.stop()
+
+curr_info = get_session_info(st.session_state.current_session_id)
+if not curr_info: st.stop()
+st.title(curr_info['title'])
+
+# LOGIQUE DE FUSION (en tâche de fond : on remonte tout de suite au parent, le résumé y arrive tout seul)
+if st.session_state.get("trigger_fusion"):
+    st.session_state.trigger_fusion = False
+    sid, parent = st.session_state.current_session_id, curr_info['parent_id']
+    lancer_job("fusion", {"session_id": sid, "parent_id": parent, "title": curr_info['title']},
+               session_id=parent, key=f"fusion:{sid}:{len(st.session_state.conv)}")
+    st.session_state.current_session_id = parent
+    st.session_state.conv = open_conversation(parent)
+    st.rerun()
+
+# FUSION DE TOUT LE SOUS-ARBRE (feuilles -> dossier actif, branches sœurs en parallèle, en tâche de fond)
+if st.session_state.get("trigger_fusion_arbre"):
+    st.session_state.trigger_fusion_arbre = False
+    sid = st.session_state.current_session_id
+    lancer_job("fusion_arbre", {"root_id": sid}, session_id=sid, key=f"fusion_arbre:{sid}:{len(st.session_state.conv)}")
+
+if erreur := st.session_state.pop("job_erreur", None): st.error(erreur)
+suivi_jobs()
+
+# CHAT
+up = st.file_uploader("PDF", type="pdf")
+pdf_txt = ""
+pdf_sha = None
+index_pdf = None
+pdf_en_lecture = False  # extraction en cours : le premier plan du Manager l'attend
+if up:
+    # Texte du PDF parsé une seule fois (clé = SHA-256 des octets), puis servi par le cache
+    if "pdf_cache" not in st.session_state: st.session_state.pdf_cache = PdfCache()
+    if st.session_state.get("pdf_file_id") != up.file_id:
+        st.session_state.pdf_sha = file_hash(up.getvalue())
+        st.session_state.pdf_file_id = up.file_id
+    sha = st.session_state.pdf_sha
+    pages = st.session_state.pdf_cache.cached(sha)
+    if pages is None and st.session_state.get("pdf_illisible") == sha:
+        st.caption("📄 PDF illisible : le Professeur répond sans lui.")
+    elif pages is None:
+        # Jamais lu : extraction en tâche de fond, le chat reste utilisable en attendant.
+        # Job déjà DONE mais texte absent du cache (cache vidé, autre JOBS_DB) : une relecture, puis on renonce.
+        path = st.session_state.pdf_cache.stash(up.getvalue(), sha)
+        for cle in (f"pdf:{sha}", f"pdf:{sha}:relecture"):
+            if lancer_job("pdf", {"path": path, "sha": sha}, session_id=st.session_state.current_session_id, key=cle)["status"] != DONE:
+                pdf_en_lecture = True
+                break
+        else:
+            st.session_state.pdf_illisible = sha
+            st.session_state.pdf_cache.unstash(sha)  # aucune tâche ne le lira plus
+    else:
+        pdf_txt, pdf_sha = join_pages(pages), sha
+        # Index BM25 des morceaux du PDF : construit une fois par fichier, il survit aux reruns
+        if st.session_state.get("pdf_index_key") != sha:
+            from pdf_index import build_index  # NumPy : seulement quand un PDF est chargé
+            st.session_state.pdf_index = build_index(pages)
+            st.session_state.pdf_index_key = sha
+        index_pdf = st.session_state.pdf_index
+
+conv = st.session_state.conv
+# Rendu fenêtré : seuls les derniers messages sont dessinés, quelle que soit la longueur de la session
+fenetre = st.session_state.get("fenetre", FENETRE_AFFICHAGE)
+if len(conv) > fenetre or conv.has_more:
+    if st.button("⬆️ Charger plus ancien"):
+        if len(conv) <= fenetre: load_older(conv)
+        st.session_state.fenetre = fenetre + FENETRE_AFFICHAGE
+        st.rerun()
+for m in conv.messages[-fenetre:]:
+    with st.chat_message(m["role"]): st.markdown(m["content"])
+
+# LOGIQUE SPÉCIALE (COACH/QUIZ) - après l'historique pour que le stream s'affiche en bas du chat
+if st.session_state.get("special_trigger"):
+    trig = st.session_state.special_trigger
+    st.session_state.special_trigger = None
+    hist = conv  # résumé glissant + tours récents, déjà au format Gemini
+    if trig == "quiz":
+        # APPEL DIRECT
+        chunks = get_examiner_quiz(st.secrets["GOOGLE_API_KEY"], hist, pdf_index=index_pdf, fallback=MSG_SURCHARGE)
+    elif trig == "coach":
+        # APPEL DIRECT
+        chunks = get_coach_advice(st.secrets["GOOGLE_API_KEY"], hist, fallback=MSG_SURCHARGE)
+    elif trig == "fiche":
+        # Tâche de fond : la fiche arrive dans la conversation quand elle est prête
+        sid = st.session_state.current_session_id
+        lancer_job("fiche", {"session_id": sid}, session_id=sid, key=f"fiche:{sid}:{len(conv)}")
+        st.rerun()
+    elif trig == "revue":
+        # Les 3 spécialistes en parallèle, fusionnés dans un ordre fixe -> un seul message, une seule écriture
+        def revue():
+            for titre, texte in get_full_review(st.secrets["GOOGLE_API_KEY"], hist, pdf_index=index_pdf, fallback=MSG_SURCHARGE):
+                yield f"#### {titre}\n{texte}\n\n"
+        chunks = revue()
+
+    # Le titre de l'agent s'affiche avec le premier morceau, le reste arrive en direct
+    # (signé : le cache exact des spécialistes ignore ces réponses quand elles reviennent dans l'historique)
+    full = afficher_stream(chunks, f"Appel {trig}...", entete=signed(trig))
+    conv.append("assistant", full)
+    save_msg(st.session_state.current_session_id, "assistant", full)
+    context_window.maybe_compact(conv, resumer_contexte)
+
+# Le plan est stocké sur la session (ou hérité d'un dossier parent) : jamais régénéré en naviguant
+porteur = storage.plan_of(get_tree(), st.session_state.current_session_id)
+premier_plan = len(conv) == 0 and not porteur and not curr_info.get("parent_id")
+if premier_plan and pdf_en_lecture:
+    st.caption("📄 Lecture du PDF en cours : le Manager l'attend pour faire le plan.")
+if porteur and not storage.plan_matches_pdf(porteur, pdf_sha):
+    # Plan fait sans ce PDF (ou pour un autre) : on propose de le refaire, sans l'imposer
+    c1, c2 = st.columns([4, 1])
+    c1.caption(f"📄 Le plan a été fait {'pour un autre PDF' if porteur.get('pdf_hash') else 'sans PDF'}.")
+    if c2.button("🔁 Refaire le plan"):
+        objectif = porteur.get("objectif") or porteur["title"]
+        with st.spinner("Manager..."):
+            resp = get_manager_plan(st.secrets["GOOGLE_API_KEY"], objectif, pdf_txt, fallback=MSG_SURCHARGE)
+        if resp == MSG_SURCHARGE:
+            st.warning(resp)
+        else:
+            save_plan(porteur["session_id"], resp, pdf_sha, objectif)
+            st.rerun()
+
+if txt := st.chat_input("...", disabled=premier_plan and pdf_en_lecture):
+    save_msg(st.session_state.current_session_id, "user", txt)
+    with st.chat_message("user"): st.write(txt)
+
+    # IA REPONSE
+    if premier_plan:
+        with st.spinner("Manager..."):
+            # APPEL DIRECT
+            resp = get_manager_plan(st.secrets["GOOGLE_API_KEY"], txt, pdf_txt, fallback=MSG_SURCHARGE)
+            save_plan(st.session_state.current_session_id, resp, pdf_sha, objectif=txt)
+        with st.chat_message("assistant"): st.write(resp)
+    else:
+        c = porteur["plan"] if porteur else "Contexte libre"
+        # APPEL DIRECT (streaming : on n'enregistre qu'une fois le flux terminé)
+        # La question n'est ajoutée à conv qu'après : la ChatSession vivante l'envoie elle-même
+        resp = afficher_stream(get_professor_response(st.secrets["GOOGLE_API_KEY"], conv, txt, c,
+                                                      pdf_index=index_pdf, pdf_text=pdf_txt, pdf_hash=pdf_sha,
+                                                      dedup=bool(porteur) and st.secrets.get("CACHE_SEMANTIQUE", False),
+                                                      fallback=MSG_SURCHARGE), "Professeur...")
+
+    conv.append("user", txt)
+    conv.append("assistant", resp)
+    save_msg(st.session_state.current_session_id, "assistant", resp)
+    # Contexte trop long ? Les vieux tours passent dans le résumé glissant (budget du Professeur)
+    context_window.maybe_compact(conv, resumer_contexte)
@@ -0,0 +1,175 @@
+"""File de tâches de fond persistante (SQLite) : fusions, fiches, lecture de PDF.
+
+L'interface ne fait que `submit()` puis interroge le statut (`get`, `jobs`) ;
+le travail tourne dans un pool de threads du process et son état vit dans
+SQLite, donc il survit aux reruns Streamlit. Après un redémarrage, `resume()`
+relance ce qui était en cours.
+
+- Idempotence : une tâche a une `key` (ex: "fusion:<session>:<nb de tours>").
+  Soumettre deux fois la même clé renvoie le même job, sans refaire le travail.
+- Retries : une tâche qui lève une exception est relancée (backoff
+  exponentiel) jusqu'à `max_attempts`, puis passe en "failed". La resoumettre
+  la relance.
+- Résultat : `on_done(job, résultat)` (ex: écriture du message via save_msg)
+  est appelé une fois, et marqué livré dans la base.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+ACTIFS = (PENDING, RUNNING)
+
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 5.0  # secondes avant le 1er retry (puis x2)
+WORKERS = 2        # tâches lourdes simultanées (chacune peut elle-même paralléliser ses appels Gemini)
+
+COLONNES = ("id", "key", "kind", "session_id", "payload", "status", "attempts",
+            "result", "error", "created", "updated", "delivered")
+
+
+class JobQueue:
+    def __init__(self, path, workers=WORKERS, max_attempts=MAX_ATTEMPTS, retry_delay=RETRY_DELAY, clock=time.time):
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._clock = clock
+        self._handlers = {}  # kind -> (fonction, on_done)
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jobs")
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, key TEXT UNIQUE, kind TEXT, session_id TEXT, payload TEXT, "
+            "status TEXT, attempts INTEGER DEFAULT 0, result TEXT, error TEXT, "
+            "created REAL, updated REAL, delivered INTEGER DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_session ON jobs (session_id, created)")
+        self._conn.commit()
+
+    # --- BASE ---
+    def _execute(self, sql, args=()):
+        with self._lock:
+            cur = self._conn.execute(sql, args)
+            self._conn.commit()
+            return cur.rowcount
+
+    def _rows(self, sql, args=()):
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(COLONNES)} FROM jobs {sql}", args).fetchall()
+        return [self._as_dict(r) for r in rows]
+
+    @staticmethod
+    def _as_dict(row):
+        job = dict(zip(COLONNES, row))
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    # --- API ---
+    def register(self, kind, fn, on_done=None):
+        """`fn(**payload)` fait le travail ; `on_done(job, résultat)` le livre (optionnel)."""
+        self._handlers[kind] = (fn, on_done)
+
+    def submit(self, kind, payload, session_id=None, key=None):
+        """Met une tâche en file et renvoie son id (celui du job existant si `key` est déjà connue)."""
+        key = key or f"{kind}:{uuid.uuid4().hex}"
+        now = self._clock()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (id, key, kind, session_id, payload, status, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (uuid.uuid4().hex, key, kind, session_id, json.dumps(payload, ensure_ascii=False), PENDING, now, now),
+            )
+            # Resoumettre un job en échec le relance (nouvelle série de tentatives)
+            relance = self._conn.execute(
+                "UPDATE jobs SET status = ?, attempts = 0, error = NULL, updated = ? WHERE key = ? AND status = ?",
+                (PENDING, now, key, FAILED),
+            ).rowcount
+            job_id, status, attempts = self._conn.execute(
+                "SELECT id, status, attempts FROM jobs WHERE key = ?", (key,)).fetchone()
+            self._conn.commit()
+        if status == PENDING and (attempts == 0 or relance):
+            self._schedule(job_id)
+        return job_id
+
+    def get(self, job_id):
+        rows = self._rows("WHERE id = ?", (job_id,))
+        return rows[0] if rows else None
+
+    def jobs(self, session_id=None, active_only=False, limit=20):
+        """Jobs les plus récents (d'une session), pour l'affichage du statut."""
+        where, args = [], []
+        if session_id is not None:
+            where.append("session_id = ?")
+            args.append(session_id)
+        if active_only:
+            where.append(f"status IN ({', '.join('?' * len(ACTIFS))})")
+            args.extend(ACTIFS)
+        sql = ("WHERE " + " AND ".join(where) if where else "") + " ORDER BY created DESC LIMIT ?"
+        return self._rows(sql, args + [limit])
+
+    def resume(self):
+        """Au démarrage : relance ce qu'un process précédent a laissé en cours ou non livré."""
+        self._execute("UPDATE jobs SET status = ? WHERE status = ?", (PENDING, RUNNING))
+        for job in self._rows("WHERE status = ?", (PENDING,)):
+            self._schedule(job["id"])
+        for job in self._rows("WHERE status = ? AND delivered = 0", (DONE,)):
+            self._deliver(job)
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    # --- EXÉCUTION ---
+    def _schedule(self, job_id, delay=0.0):
+        if delay > 0:
+            timer = threading.Timer(delay, self._schedule, (job_id,))
+            timer.daemon = True
+            timer.start()
+        else:
+            self._pool.submit(self._run, job_id)
+
+    def _run(self, job_id):
+        # Réclame le job : si un autre worker l'a déjà pris, on ne fait rien
+        claimed = self._execute(
+            "UPDATE jobs SET status = ?, attempts = attempts + 1, updated = ? WHERE id = ? AND status = ?",
+            (RUNNING, self._clock(), job_id, PENDING),
+        )
+        if not claimed:
+            return
+        job = self.get(job_id)
+        handler = self._handlers.get(job["kind"])
+        try:
+            if handler is None:
+                raise LookupError(f"Aucun handler pour {job['kind']!r}")
+            result = handler[0](**job["payload"])
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if handler is not None and job["attempts"] < self.max_attempts:
+                self._execute("UPDATE jobs SET status = ?, error = ?, updated = ? WHERE id = ?",
+                              (PENDING, error, self._clock(), job_id))
+                self._schedule(job_id, self.retry_delay * 2 ** (job["attempts"] - 1))
+            else:
+                self._execute("UPDATE jobs SET status = ?, error = ?, updated = ? WHERE id = ?",
+                              (FAILED, error, self._clock(), job_id))
+            return
+        self._execute("UPDATE jobs SET status = ?, result = ?, error = NULL, updated = ? WHERE id = ?",
+                      (DONE, json.dumps(result, ensure_ascii=False), self._clock(), job_id))
+        self._deliver(dict(job, status=DONE, result=result))
+
+    def _deliver(self, job):
+        handler = self._handlers.get(job["kind"])
+        on_done = handler[1] if handler else None
+        if on_done is not None:
+            try:
+                on_done(job, job["result"])
+            except Exception as e:
+                # Résultat gardé en base, non livré : resume() retentera la livraison
+                self._execute("UPDATE jobs SET error = ? WHERE id = ?", (f"livraison : {type(e).__name__}: {e}", job["id"]))
+                return
+        self._execute("UPDATE jobs SET delivered = 1 WHERE id = ?", (job["id"],))
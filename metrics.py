@@ -0,0 +1,233 @@
+"""Métriques par appel : latence, tokens, retries et hits de cache, par agent.
+
+Chaque appel Gemini ou Firestore passe dans `track(backend, agent)` :
+
+    with metrics.track("gemini", "professeur") as call:
+        response = airbag.call_with_retry(send, on_retry=call.on_retry)
+        call.usage(response)
+
+À la sortie du `with`, une ligne de log JSON part sur le logger
+"super_prof.metrics" et les agrégats en mémoire sont mis à jour. Ils sont
+lisibles par `snapshot()` (panneau admin de la sidebar) et exportables au
+format texte Prometheus (`prometheus_text()`, ou `serve(port)` pour un
+endpoint /metrics).
+"""
+import json
+import logging
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger("super_prof.metrics")
+
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # secondes (histogramme Prometheus)
+FENETRE = 1000  # durées gardées par (backend, agent) pour p50/p95
+
+
+def percentile(values, p):
+    """Percentile "nearest rank" : le p95 de 20 mesures est la 19e, pas la 20e."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class Call:
+    """Un appel en cours : l'appelant complète les champs avant la fin du `with`."""
+
+    def __init__(self, backend, agent):
+        self.backend = backend
+        self.agent = agent or "?"
+        self.seconds = 0.0
+        self.ttft = None
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        self.cached_tokens = 0
+        self.retries = 0
+        self.error = None
+
+    def on_retry(self, n, error, delay):
+        """À passer tel quel en `on_retry` à airbag.call_with_retry."""
+        self.retries = n
+
+    def usage(self, response):
+        """Relève les tokens de `usage_metadata` (le dernier morceau d'un flux porte les totaux)."""
+        meta = getattr(response, "usage_metadata", None)
+        if meta is None:
+            return
+        self.prompt_tokens = getattr(meta, "prompt_token_count", 0) or self.prompt_tokens
+        self.response_tokens = getattr(meta, "candidates_token_count", 0) or self.response_tokens
+        self.cached_tokens = getattr(meta, "cached_content_token_count", 0) or self.cached_tokens
+
+    def as_dict(self):
+        return {
+            "backend": self.backend, "agent": self.agent,
+            "ms": round(self.seconds * 1000, 1),
+            "ttft_ms": None if self.ttft is None else round(self.ttft * 1000, 1),
+            "prompt_tokens": self.prompt_tokens, "response_tokens": self.response_tokens,
+            "cached_tokens": self.cached_tokens, "retries": self.retries, "error": self.error,
+        }
+
+
+class Metrics:
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._totals = defaultdict(lambda: defaultdict(float))  # (backend, agent) -> compteurs
+            self._durations = defaultdict(lambda: deque(maxlen=FENETRE))
+            self._buckets = defaultdict(lambda: [0] * len(BUCKETS))
+
+    @contextmanager
+    def track(self, backend, agent=None):
+        call = Call(backend, agent)
+        start = self._clock()
+        call._start = start
+        try:
+            yield call
+        except Exception as e:
+            call.error = type(e).__name__
+            raise
+        finally:
+            call.seconds = self._clock() - start
+            self.record(call)
+
+    def first_chunk(self, call):
+        """Temps jusqu'au premier morceau d'un flux (time-to-first-token)."""
+        if call.ttft is None:
+            call.ttft = self._clock() - call._start
+
+    def record(self, call):
+        key = (call.backend, call.agent)
+        with self._lock:
+            t = self._totals[key]
+            t["calls"] += 1
+            t["seconds"] += call.seconds
+            t["prompt_tokens"] += call.prompt_tokens
+            t["response_tokens"] += call.response_tokens
+            t["cached_tokens"] += call.cached_tokens
+            t["retries"] += call.retries
+            t["errors"] += call.error is not None
+            self._durations[key].append(call.seconds)
+            buckets = self._buckets[key]
+            for i, limit in enumerate(BUCKETS):
+                if call.seconds <= limit:
+                    buckets[i] += 1
+        log.info(json.dumps(dict(call.as_dict(), event="call"), ensure_ascii=False))
+
+    def cache_event(self, agent, hit):
+        with self._lock:
+            self._totals[("cache", agent or "?")]["hits" if hit else "misses"] += 1
+        log.info(json.dumps({"event": "cache", "agent": agent, "hit": hit}, ensure_ascii=False))
+
+    def snapshot(self):
+        """Une ligne par (backend, agent), triée par temps total décroissant (les points chauds d'abord)."""
+        with self._lock:
+            rows = []
+            for (backend, agent), t in self._totals.items():
+                durations = list(self._durations[(backend, agent)])
+                calls = int(t["calls"])
+                rows.append({
+                    "backend": backend, "agent": agent, "calls": calls,
+                    "p50_ms": round(percentile(durations, 50) * 1000, 1),
+                    "p95_ms": round(percentile(durations, 95) * 1000, 1),
+                    "total_s": round(t["seconds"], 2),
+                    "prompt_tokens": int(t["prompt_tokens"]), "response_tokens": int(t["response_tokens"]),
+                    "cached_tokens": int(t["cached_tokens"]), "retries": int(t["retries"]), "errors": int(t["errors"]),
+                    "cache_hits": int(t["hits"]), "cache_misses": int(t["misses"]),
+                })
+        return sorted(rows, key=lambda r: r["total_s"], reverse=True)
+
+    def prometheus_text(self):
+        """Export au format texte Prometheus (exposition 0.0.4)."""
+        lines = [
+            "# TYPE superprof_call_seconds histogram",
+            "# TYPE superprof_tokens_total counter",
+            "# TYPE superprof_retries_total counter",
+            "# TYPE superprof_errors_total counter",
+            "# TYPE superprof_cache_total counter",
+        ]
+        with self._lock:
+            for (backend, agent), t in sorted(self._totals.items()):
+                labels = f'backend="{backend}",agent="{agent}"'
+                if backend == "cache":
+                    lines.append(f'superprof_cache_total{{agent="{agent}",result="hit"}} {int(t["hits"])}')
+                    lines.append(f'superprof_cache_total{{agent="{agent}",result="miss"}} {int(t["misses"])}')
+                    continue
+                for limit, count in zip(BUCKETS, self._buckets[(backend, agent)]):
+                    lines.append(f'superprof_call_seconds_bucket{{{labels},le="{limit}"}} {count}')
+                lines.append(f'superprof_call_seconds_bucket{{{labels},le="+Inf"}} {int(t["calls"])}')
+                lines.append(f'superprof_call_seconds_sum{{{labels}}} {t["seconds"]:.6f}')
+                lines.append(f'superprof_call_seconds_count{{{labels}}} {int(t["calls"])}')
+                lines.append(f'superprof_tokens_total{{{labels},kind="prompt"}} {int(t["prompt_tokens"])}')
+                lines.append(f'superprof_tokens_total{{{labels},kind="response"}} {int(t["response_tokens"])}')
+                lines.append(f'superprof_tokens_total{{{labels},kind="cached"}} {int(t["cached_tokens"])}')
+                lines.append(f'superprof_retries_total{{{labels}}} {int(t["retries"])}')
+                lines.append(f'superprof_errors_total{{{labels}}} {int(t["errors"])}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def track(backend, agent=None):
+    """Raccourci vers le registre du process (lu à l'appel : remplaçable, ex. benchmarks)."""
+    return metrics.track(backend, agent)
+
+
+def first_chunk(call):
+    metrics.first_chunk(call)
+
+
+def cache_event(agent, hit):
+    metrics.cache_event(agent, hit)
+
+
+def timed(backend, name):
+    """Décorateur : chaque appel de la fonction est mesuré comme `track(backend, name)`."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with track(backend, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def enable_json_logs(level=logging.INFO):
+    """Envoie les lignes JSON sur stderr (une par appel), si personne ne l'a déjà fait."""
+    if not log.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(handler)
+        log.propagate = False
+    log.setLevel(level)
+
+
+def serve(port, host="0.0.0.0"):
+    """Endpoint texte Prometheus (GET /metrics) dans un thread de fond ; renvoie le serveur."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,90 @@
+"""Registre des GenerativeModel déjà configurés.
+
+Un modèle est construit une seule fois par (clé d'API, nom du modèle, hash du
+system_instruction) puis réutilisé, avec éviction LRU. `genai.configure` est
+une config globale du SDK : elle passe toujours par ici (`configure`) et n'est
+rappelée que si la clé change.
+
+Le SDK (`google.generativeai`, lourd à importer) n'est chargé qu'à la
+construction du premier modèle : l'écran de connexion n'en a pas besoin.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+MODELE_PAR_DEFAUT = "models/gemini-1.5-flash"
+
+
+def prompt_hash(text):
+    """Empreinte courte et stable d'un prompt (sert de morceau de clé)."""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()[:16]
+
+
+class ModelRegistry:
+    """Cache LRU de modèles, partagé par toutes les sessions du process.
+
+    `factory` et `configure` sont injectables : un faux backend (tests,
+    benchmarks) peut remplacer Gemini sans toucher aux agents.
+    """
+
+    def __init__(self, max_size=64, factory=None, configure=None):
+        self.max_size = max_size
+        self._factory = factory
+        self._configure = configure
+        self._models = OrderedDict()
+        self._configured_key = None
+        self._lock = threading.Lock()
+
+    def _load_sdk(self):
+        # Import différé : premier modèle demandé = premier besoin réel de Gemini
+        if self._factory is None or self._configure is None:
+            import google.generativeai as genai
+            self._factory = self._factory or genai.GenerativeModel
+            self._configure = self._configure or genai.configure
+
+    def _ensure_configured(self, api_key):
+        # genai garde UNE config globale : on ne la touche que si la clé change
+        self._load_sdk()
+        if api_key != self._configured_key:
+            self._configure(api_key=api_key)
+            self._configured_key = api_key
+
+    def get(self, api_key, system_instruction=None, model_name=MODELE_PAR_DEFAUT):
+        key = (api_key, model_name, prompt_hash(system_instruction))
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                return model
+            self._ensure_configured(api_key)
+            model = self._factory(model_name, system_instruction=system_instruction)
+            self._models[key] = model
+            if len(self._models) > self.max_size:
+                self._models.popitem(last=False)
+            return model
+
+    def configure(self, api_key):
+        """Pour les autres appels au SDK (ex: cache de contexte) : même config unique, même verrou."""
+        with self._lock:
+            self._ensure_configured(api_key)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self._configured_key = None
+
+    def __len__(self):
+        return len(self._models)
+
+
+registry = ModelRegistry()
+
+
+def get_model(api_key, system_instruction=None, model_name=MODELE_PAR_DEFAUT):
+    """Raccourci vers le registre du process."""
+    return registry.get(api_key, system_instruction, model_name)
+
+
+def configure(api_key):
+    """Raccourci : `genai.configure` via le registre du process (rappelé seulement si la clé change)."""
+    registry.configure(api_key)
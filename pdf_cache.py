@@ -0,0 +1,106 @@
+"""Cache du texte des PDF : on ne parse un fichier qu'une seule fois.
+
+La clé est le SHA-256 des octets du fichier. On cherche dans la mémoire de la
+session, puis sur disque (.cache/pdf/<sha>.json), et seulement sinon on
+extrait page par page. PyPDF2 n'est importé qu'à la première extraction réelle.
+"""
+import hashlib
+import io
+import json
+import os
+
+CACHE_DIR = os.path.join(".cache", "pdf")
+MAX_EN_MEMOIRE = 4  # PDF gardés dans la session
+
+
+def file_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def iter_pages(data):
+    """Extraction paresseuse : une page à la fois, au fil de l'itération."""
+    import PyPDF2  # seulement quand un fichier est vraiment à lire (cache froid)
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    for page in reader.pages:
+        yield page.extract_text() or ""
+
+
+class PdfCache:
+    """`memory` est un dict propre à la session (ex: st.session_state), le disque est partagé."""
+
+    def __init__(self, memory=None, directory=CACHE_DIR):
+        self.memory = memory if memory is not None else {}
+        self.directory = directory
+
+    def _path(self, sha):
+        return os.path.join(self.directory, f"{sha}.json")
+
+    def _read_disk(self, sha):
+        try:
+            with open(self._path(sha), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, sha, pages):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self._path(sha) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(pages, f, ensure_ascii=False)
+        os.replace(tmp, self._path(sha))  # jamais de fichier à moitié écrit
+
+    def _remember(self, sha, pages):
+        self.memory[sha] = pages
+        while len(self.memory) > MAX_EN_MEMOIRE:
+            self.memory.pop(next(iter(self.memory)))
+
+    def cached(self, sha):
+        """Pages déjà extraites (mémoire puis disque), ou None : ne parse jamais."""
+        pages = self.memory.get(sha)
+        if pages is None:
+            pages = self._read_disk(sha)
+            if pages is not None:
+                self._remember(sha, pages)
+        return pages
+
+    def pages(self, data, sha=None):
+        """Renvoie (sha, liste des textes de pages) pour les octets d'un PDF."""
+        sha = sha or file_hash(data)
+        pages = self.cached(sha)
+        if pages is None:
+            pages = list(iter_pages(data))
+            self._write_disk(sha, pages)
+            self._remember(sha, pages)
+        return sha, pages
+
+    def _stash_path(self, sha):
+        return os.path.join(self.directory, f"{sha}.pdf")
+
+    def stash(self, data, sha):
+        """Dépose les octets du PDF sur disque pour une tâche de fond ; renvoie le chemin."""
+        path = self._stash_path(sha)
+        if not os.path.exists(path):
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+        return path
+
+    def unstash(self, sha):
+        """Supprime les octets déposés par stash() : plus aucune tâche ne les lira."""
+        try:
+            os.remove(self._stash_path(sha))
+        except OSError:
+            pass
+
+    def extract(self, path, sha):
+        """Tâche de fond : parse le PDF déposé par stash(), garde le texte, supprime le fichier."""
+        with open(path, "rb") as f:
+            _, pages = self.pages(f.read(), sha=sha)
+        self.unstash(sha)
+        return len(pages)
+
+
+def join_pages(pages):
+    """Concaténation en une passe (pas de `+=` quadratique)."""
+    return "".join(pages)
@@ -0,0 +1,123 @@
+"""Index lexical local (BM25) sur les morceaux d'un PDF de cours.
+
+Le PDF est découpé en morceaux et indexé une fois (tableaux NumPy) ; chaque
+question du Professeur / de l'Examinateur ne reçoit que les top-k morceaux
+pertinents.
+"""
+import re
+from collections import Counter
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Mots vides : ils ne disent rien du sujet
+STOPWORDS = frozenset("""
+le la les un une des de du d l au aux et ou mais donc or ni car que qui quoi dont où
+ce cet cette ces son sa ses leur leurs mon ma mes ton ta tes notre nos votre vos
+je tu il elle on nous vous ils elles me te se en y ne pas plus est sont été être
+a ai as avons avez ont avoir fait faire pour par sur sous dans avec sans entre
+comme si très tout tous toute toutes aussi cela ça c qu s n the of and to in is
+""".split())
+
+
+def tokenize(text):
+    # Les nombres restent, même d'un chiffre : "exercice 3", "chapitre 2"
+    return [w for w in TOKEN_RE.findall(text.lower()) if (len(w) > 1 or w.isdigit()) and w not in STOPWORDS]
+
+
+def chunk_pages(pages, size=180, overlap=40):
+    """Découpe les pages en morceaux d'environ `size` mots qui se chevauchent.
+
+    `pages` est un itérable de textes (un par page). Chaque morceau garde son
+    numéro de page de départ pour pouvoir citer la source.
+    """
+    chunks = []
+    step = max(1, size - overlap)
+    for page_no, text in enumerate(pages, start=1):
+        words = (text or "").split()
+        for start in range(0, len(words), step):
+            part = words[start:start + size]
+            if part:
+                chunks.append({"page": page_no, "text": " ".join(part)})
+            if start + size >= len(words):
+                break
+    return chunks
+
+
+class BM25Index:
+    """BM25 en postings triés par terme : une requête ne touche que ses propres termes."""
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.vocab = {}
+        doc_ids, term_ids, tfs = [], [], []
+        doc_len = np.zeros(len(chunks), dtype=np.float32)
+        for d, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk["text"]))
+            doc_len[d] = sum(counts.values())
+            for term, tf in counts.items():
+                doc_ids.append(d)
+                term_ids.append(self.vocab.setdefault(term, len(self.vocab)))
+                tfs.append(tf)
+
+        n_docs = len(chunks)
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind="stable")
+        docs = np.asarray(doc_ids, dtype=np.int64)[order]
+        tf = np.asarray(tfs, dtype=np.float32)[order]
+        df = np.bincount(term_ids, minlength=len(self.vocab))
+        self._offsets = np.concatenate([[0], np.cumsum(df)])
+
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = doc_len.mean() if n_docs else 1.0
+        norm = k1 * (1 - b + b * doc_len[docs] / max(avgdl, 1e-6))
+        # Le poids BM25 de chaque posting est fixe : on le précalcule une fois
+        self._weights = idf[term_ids[order]] * tf * (k1 + 1) / (tf + norm)
+        self._docs = docs
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def scores(self, query):
+        ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not ids or not self.chunks:
+            return np.zeros(len(self.chunks), dtype=np.float32)
+        sl = [slice(self._offsets[i], self._offsets[i + 1]) for i in ids]
+        docs = np.concatenate([self._docs[s] for s in sl])
+        weights = np.concatenate([self._weights[s] for s in sl])
+        return np.bincount(docs, weights=weights, minlength=len(self.chunks))
+
+    def search(self, query, k=4):
+        """Les k morceaux les plus pertinents (score > 0), du meilleur au moins bon."""
+        scores = self.scores(query)
+        if not len(scores):
+            return []
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [self.chunks[i] for i in top if scores[i] > 0]
+
+
+def build_index(pages):
+    return BM25Index(chunk_pages(pages))
+
+
+def format_extraits(chunks):
+    """Met en forme les morceaux retrouvés pour les glisser dans un prompt."""
+    if not chunks:
+        return ""
+    lines = [f"[p. {c['page']}] {c['text']}" for c in chunks]
+    return "Extraits pertinents du cours (PDF) :\n" + "\n\n".join(lines) + "\n\n"
+
+
+def extraits_pour(index, query, k=4):
+    """Raccourci : texte d'extraits prêt à préfixer la question (vide sans index)."""
+    if index is None:
+        return ""
+    return format_extraits(index.search(query, k=k))
+
+
+def query_from_history(history, n=4):
+    """Requête de recherche tirée des n derniers tours (pour l'Examinateur)."""
+    return " ".join(str(p) for turn in history[-n:] for p in turn.get("parts", []))
@@ -0,0 +1,170 @@
+"""Cache de réponses pour les agents déterministes (Manager, Scribe, Examinateur).
+
+Clé = empreinte de (agent, system prompt, historique normalisé, prompt, modèle).
+Deux étages : une mémoire LRU bornée devant un étage disque optionnel (SQLite),
+chacun avec TTL et taille max. Les compteurs hits/misses sont dans `stats()`.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from model_registry import MODELE_PAR_DEFAUT
+
+
+def _normalize(text):
+    return " ".join(str(text).split())
+
+
+def normalize_history(history):
+    """Réduit un historique Gemini à une liste [(role, texte)] insensible aux espaces."""
+    turns = []
+    for turn in history or []:
+        if isinstance(turn, dict):
+            parts = turn.get("parts", [])
+            turns.append((turn.get("role", ""), _normalize(" ".join(str(p) for p in parts))))
+        else:
+            turns.append(("", _normalize(turn)))
+    return turns
+
+
+def make_key(agent, system_prompt, history, prompt="", model_name=MODELE_PAR_DEFAUT):
+    payload = json.dumps(
+        [agent, _normalize(system_prompt or ""), normalize_history(history), _normalize(prompt), model_name],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryTier:
+    """Étage mémoire : LRU bornée avec expiration."""
+
+    def __init__(self, max_entries=256, ttl=3600, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < self._clock():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (self._clock() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+
+class SQLiteTier:
+    """Étage disque : survit aux redémarrages, évince les moins récemment utilisés."""
+
+    def __init__(self, path, max_entries=5000, ttl=7 * 24 * 3600, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT, expires REAL, last_used REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        now = self._clock()
+        row = self._conn.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+            return None
+        self._conn.execute("UPDATE cache SET last_used = ? WHERE key = ?", (now, key))
+        self._conn.commit()
+        return row[0]
+
+    def set(self, key, value):
+        now = self._clock()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires, last_used) VALUES (?, ?, ?, ?)",
+            (key, value, now + self.ttl, now),
+        )
+        self._conn.execute("DELETE FROM cache WHERE expires < ?", (now,))
+        self._conn.execute(
+            "DELETE FROM cache WHERE key NOT IN "
+            "(SELECT key FROM cache ORDER BY last_used DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+        self._conn.commit()
+
+    def clear(self):
+        self._conn.execute("DELETE FROM cache")
+        self._conn.commit()
+
+
+class ResponseCache:
+    def __init__(self, memory=None, disk=None):
+        self.memory = memory or MemoryTier()
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self.memory.get(key)
+            if value is None and self.disk is not None:
+                value = self.disk.get(key)
+                if value is not None:
+                    self.memory.set(key, value)  # promotion vers la mémoire
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self.memory.set(key, value)
+            if self.disk is not None:
+                self.disk.set(key, value)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries_memory": len(self.memory._data),
+        }
+
+    def clear(self):
+        with self._lock:
+            self.memory.clear()
+            if self.disk is not None:
+                self.disk.clear()
+
+
+cache = ResponseCache()
+
+
+def enable_disk(path):
+    """Branche l'étage SQLite sur le cache du process (idempotent)."""
+    if cache.disk is None:
+        cache.disk = SQLiteTier(path)
+    return cache
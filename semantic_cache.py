@@ -0,0 +1,240 @@
+"""Cache "sémantique" du Professeur : questions quasi identiques, même plan.
+
+Les étudiants d'un même cours posent au Professeur presque les mêmes questions
+("c'est quoi une dérivée ?" / "C'est quoi la dérivée"). Le cache de réponses
+exact (response_cache.py) ne les reconnaît pas. Ici chaque question reçoit une
+empreinte SimHash 64 bits (mots + bigrammes, hachés puis sommés en NumPy). La
+recherche est vectorisée : XOR + popcount contre toutes les empreintes du
+périmètre. Les candidats proches sont ensuite départagés par Jaccard sur leurs
+mots (la "confiance").
+
+- confiance >= SEUIL_REPONSE  : la réponse stockée est renvoyée (0 appel API) ;
+- confiance >= SEUIL_BROUILLON : elle sert de brouillon à adapter (appel plus court) ;
+- sinon : appel normal, et la réponse est mémorisée.
+
+Le périmètre est (hash du plan, hash du PDF) : un plan = un cours. Éviction
+LRU par périmètre et entre périmètres, plus un TTL. C'est opt-in, et les
+questions qui dépendent de la conversation ("tu peux refaire ?", trop peu de
+mots significatifs, qui commencent par "et", "pour"...) ne sont ni cherchées
+ni mises en cache. Les nombres, variables d'une lettre et opérateurs comptent
+comme des mots, et doivent être identiques pour resservir une réponse :
+"x^2" et "x^3" ne sont pas la même question.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+from model_registry import prompt_hash
+from pdf_index import STOPWORDS
+
+BITS = 64
+RAYON = 18              # distance de Hamming max pour être candidat (au hasard : ~32 ± 4)
+SEUIL_REPONSE = 0.85    # confiance pour resservir la réponse telle quelle
+SEUIL_BROUILLON = 0.5   # confiance pour s'en servir comme brouillon
+MIN_MOTS = 2            # en dessous, la question dépend trop du contexte
+RACINE = 6              # "calculer" / "calcule" -> "calcul" : racinisation grossière
+MAX_PAR_PERIMETRE = 2000
+MAX_PERIMETRES = 64
+TTL = 7 * 24 * 3600
+
+# Racines qui renvoient à la conversation ("refais", "l'exemple précédent") : réponse non réutilisable
+RENVOIS = frozenset("refais refair encore précéd dessus contin repren réexpl reexpl pareil lentem autre".split())
+# Premiers mots qui enchaînent sur le tour précédent ("Et pour une fonction composée ?")
+AMORCES = frozenset("et pour aussi mais puis ensuite".split())
+
+# Nombres (2, 3.5), mots, et opérateurs (^ + - * / = ...) ; le tiret de "qu'est-ce" n'en est pas un
+TOKEN_RE = re.compile(r"\d+(?:[.,]\d+)?|[^\W\d_]+|[+*/^=<>≤≥√∫∑π²³%]|-(?![^\W\d_])|(?<![^\W\d_])-",
+                      re.UNICODE)
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+_BIT_WEIGHTS = (np.uint64(1) << np.arange(BITS, dtype=np.uint64))
+
+
+def _exact(token):
+    # Nombre, variable d'une lettre ou opérateur : gardé tel quel et comparé à l'identique
+    return len(token) == 1 or not token.isalpha()
+
+
+def words(question):
+    """Mots significatifs (racinisés), nombres, variables et opérateurs, dans l'ordre."""
+    return [t if _exact(t) else t[:RACINE]
+            for t in TOKEN_RE.findall(question.lower().replace("-t-", " "))  # "calcule-t-on" : pas une variable
+            if t not in STOPWORDS]
+
+
+def symbols(question):
+    """Nombres, variables d'une lettre et opérateurs : ce qui change la réponse même sans changer les mots."""
+    return frozenset(t for t in words(question) if _exact(t))
+
+
+def standalone(question):
+    """Assez de mots, et aucun renvoi à la conversation : la réponse vaut pour tout le cours."""
+    first = TOKEN_RE.match(question.strip().lower())
+    if first is not None and first.group() in AMORCES:
+        return False
+    ws = set(words(question))
+    return len(ws) >= MIN_MOTS and not ws & RENVOIS
+
+
+def features(question):
+    """Mots (comptés double) + bigrammes : les mots pèsent plus que leur ordre."""
+    ws = words(question)
+    return ws + ws + [f"{a}_{b}" for a, b in zip(ws, ws[1:])]
+
+
+def simhash(question):
+    """Empreinte SimHash 64 bits (np.uint64) des mots et bigrammes de la question."""
+    feats = features(question)
+    if not feats:
+        return np.uint64(0)
+    hashes = np.array([int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "little")
+                       for f in feats], dtype=np.uint64)
+    bits = (hashes[:, None] >> np.arange(BITS, dtype=np.uint64)) & np.uint64(1)  # (n, 64)
+    votes = bits.astype(np.int32).sum(axis=0) * 2 - len(feats)
+    return np.uint64(_BIT_WEIGHTS[votes > 0].sum()) if (votes > 0).any() else np.uint64(0)
+
+
+def hamming(fingerprints, fp):
+    """Distances de Hamming entre `fp` et chaque empreinte du tableau (vectorisé)."""
+    xor = np.bitwise_xor(fingerprints, fp)
+    return _POPCOUNT8[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def scope_for(plan, pdf_hash=None):
+    return prompt_hash(plan), pdf_hash or ""
+
+
+@dataclass
+class Match:
+    question: str
+    answer: str
+    confidence: float
+    same_symbols: bool = True  # mêmes nombres / variables / opérateurs que la question posée
+
+    @property
+    def reusable(self):
+        return self.same_symbols and self.confidence >= SEUIL_REPONSE
+
+
+class _Scope:
+    """Empreintes d'un périmètre dans un tableau NumPy qui grandit par doublement."""
+
+    def __init__(self):
+        self.fps = np.zeros(16, dtype=np.uint64)
+        self.last_used = np.zeros(16, dtype=np.float64)
+        self.entries = []  # [(question, mots, réponse, créée le)]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, fp, question, answer, now):
+        n = len(self.entries)
+        if n == len(self.fps):
+            self.fps = np.concatenate([self.fps, np.zeros(n, dtype=np.uint64)])
+            self.last_used = np.concatenate([self.last_used, np.zeros(n)])
+        self.fps[n] = fp
+        self.last_used[n] = now
+        self.entries.append((question, frozenset(words(question)), answer, now))
+
+    def keep(self, mask):
+        idx = np.flatnonzero(mask)
+        n = len(idx)
+        self.entries = [self.entries[i] for i in idx]
+        fps, last = self.fps[idx], self.last_used[idx]
+        size = max(16, len(self.fps))
+        self.fps = np.zeros(size, dtype=np.uint64)
+        self.last_used = np.zeros(size)
+        self.fps[:n], self.last_used[:n] = fps, last
+
+
+class SemanticCache:
+    def __init__(self, max_per_scope=MAX_PAR_PERIMETRE, max_scopes=MAX_PERIMETRES, ttl=TTL, clock=time.time):
+        self.max_per_scope = max_per_scope
+        self.max_scopes = max_scopes
+        self.ttl = ttl
+        self._clock = clock
+        self._scopes = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.drafts = self.misses = 0
+
+    def lookup(self, scope, question):
+        """Meilleure question proche déjà répondue dans ce périmètre (Match), ou None."""
+        if not standalone(question):
+            return None
+        mots_q = frozenset(words(question))
+        fp = simhash(question)
+        now = self._clock()
+        with self._lock:
+            s = self._scopes.get(scope)
+            if s is None or not len(s):
+                self.misses += 1
+                return None
+            self._scopes.move_to_end(scope)
+            n = len(s)
+            dist = hamming(s.fps[:n], fp)
+            candidates = np.flatnonzero(dist <= RAYON)
+            best, best_score = None, 0.0
+            for i in candidates:
+                q, mots, answer, created = s.entries[i]
+                if now - created > self.ttl:
+                    continue
+                score = len(mots_q & mots) / len(mots_q | mots)
+                if score > best_score:
+                    best, best_score = i, score
+            if best is None or best_score < SEUIL_BROUILLON:
+                self.misses += 1
+                return None
+            s.last_used[best] = now
+            q, mots, answer, _ = s.entries[best]
+            match = Match(q, answer, best_score, same_symbols=symbols(q) == symbols(question))
+            if match.reusable:
+                self.hits += 1
+            else:
+                self.drafts += 1
+            return match
+
+    def add(self, scope, question, answer):
+        if not answer or not standalone(question):
+            return
+        now = self._clock()
+        with self._lock:
+            s = self._scopes.get(scope)
+            if s is None:
+                s = self._scopes[scope] = _Scope()
+                while len(self._scopes) > self.max_scopes:
+                    self._scopes.popitem(last=False)
+            self._scopes.move_to_end(scope)
+            s.add(simhash(question), question, answer, now)
+            n = len(s)
+            if n > self.max_per_scope:
+                created = np.array([e[3] for e in s.entries])
+                frais = now - created <= self.ttl
+                # Les expirés d'abord, puis les moins récemment servis
+                order = np.lexsort((s.last_used[:n], frais))
+                mask = np.zeros(n, dtype=bool)
+                mask[order[n - self.max_per_scope:]] = True
+                s.keep(mask)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.drafts + self.misses
+            return {"hits": self.hits, "drafts": self.drafts, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0,
+                    "scopes": len(self._scopes), "entries": sum(len(s) for s in self._scopes.values())}
+
+    def clear(self):
+        with self._lock:
+            self._scopes.clear()
+
+
+def draft_prompt(match, question):
+    return (f"Une réponse déjà donnée à une question proche (« {match.question} ») :\n{match.answer}\n\n"
+            f"Sers-t'en comme brouillon et adapte-la à cette question : {question}")
+
+
+cache = SemanticCache()
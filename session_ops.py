@@ -0,0 +1,106 @@
+"""Opérations sur un sous-arbre de sessions : suppression en cascade et fusion globale.
+
+Supprimer une session emporte ses sous-dossiers et tous leurs messages
+`chat_history` : rien ne reste orphelin pour alourdir les requêtes
+`where("session_id", ...)`.
+"""
+from collections import defaultdict
+
+from conversation import to_gemini
+from fanout import run_parallel
+import metrics
+from write_buffer import FIRESTORE_BATCH_MAX
+
+IN_MAX = 30  # valeurs max d'un filtre "in" Firestore
+
+
+def subtree_ids(tree, root_id):
+    """Ids du sous-arbre, enfants AVANT parents (ordre de suppression / de fusion)."""
+    order, stack = [], [(root_id, False)]
+    while stack:
+        sid, expanded = stack.pop()
+        if expanded:
+            order.append(sid)
+            continue
+        stack.append((sid, True))
+        for child in tree.children(sid):
+            stack.append((child["session_id"], False))
+    return order
+
+
+def subtree_levels(tree, root_id):
+    """{profondeur: [ids]} sous root_id (root exclue, profondeur 1 = enfants directs)."""
+    levels = defaultdict(list)
+    frontier, depth = [root_id], 0
+    while frontier:
+        depth += 1
+        frontier = [c["session_id"] for sid in frontier for c in tree.children(sid)]
+        if frontier:
+            levels[depth] = frontier
+    return dict(levels)
+
+
+def delete_subtree(db, tree, root_id, chunk=FIRESTORE_BATCH_MAX, progress=None):
+    """Supprime root_id, ses descendants et tous leurs messages, par batches.
+
+    Les messages sont retrouvés avec des filtres "in" (30 sessions par requête)
+    et seules leurs références sont lues (`select([])`). `progress(fait, total)`
+    est appelé après chaque batch. Renvoie la liste des sessions supprimées.
+    """
+    ids = subtree_ids(tree, root_id)
+    refs = []
+    for start in range(0, len(ids), IN_MAX):
+        q = db.collection("chat_history").where("session_id", "in", ids[start:start + IN_MAX]).select([])
+        refs.extend(doc.reference for doc in q.stream())
+    refs.extend(db.collection("sessions").document(sid) for sid in ids)  # sessions en dernier
+
+    total = len(refs)
+    for start in range(0, total, chunk):
+        batch = db.batch()
+        for ref in refs[start:start + chunk]:
+            batch.delete(ref)
+        batch.commit()
+        if progress is not None:
+            progress(min(start + chunk, total), total)
+    for sid in ids:
+        tree.remove(sid)
+    return ids
+
+
+@metrics.timed("firestore", "read_history")
+def read_history(db, session_id, limit=200):
+    """Historique Gemini d'une session lu directement (utilisable hors du thread Streamlit)."""
+    q = db.collection("chat_history").where("session_id", "==", session_id)
+    docs = [d.to_dict() for d in q.order_by("timestamp", direction="DESCENDING").limit(limit).stream()]
+    return [to_gemini(d["role"], d["content"]) for d in reversed(docs)]
+
+
+def fuse_subtree(tree, root_id, load_history, summarize, progress=None):
+    """Fusionne tout le sous-arbre vers root_id, des feuilles vers la racine.
+
+    Chaque niveau est traité en parallèle (les branches sœurs ne dépendent
+    pas l'une de l'autre) ; un nœud reçoit en plus de son historique les
+    résumés de ses enfants. Renvoie [(parent_id, titre, résumé)] dans l'ordre
+    où les enregistrer (feuilles d'abord).
+    """
+    levels = subtree_levels(tree, root_id)
+    total = sum(len(ids) for ids in levels.values())
+    summaries, results, done = {}, [], 0
+
+    for depth in sorted(levels, reverse=True):
+        def job(sid):
+            extra = [{"role": "model", "parts": [f"✅ RÉSUMÉ {c['title']}\n{summaries[c['session_id']]}"]}
+                     for c in tree.children(sid) if c["session_id"] in summaries]
+            return summarize(load_history(sid) + extra)
+
+        tasks = [(sid, lambda sid=sid: job(sid)) for sid in levels[depth]]
+        for sid, text, error in run_parallel(tasks):
+            if error is not None:
+                raise error
+            summaries[sid] = text
+            doc = tree.get(sid)
+            results.append((doc.get("parent_id"), doc["title"], text))
+        done += len(tasks)
+        if progress is not None:
+            progress(done, total)
+    return results
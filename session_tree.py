@@ -0,0 +1,173 @@
+"""Arbre des sessions d'un utilisateur, chargé une fois et gardé à jour.
+
+L'arbre est chargé en UNE lecture de la collection `sessions` : le premier
+instantané du listener Firestore `on_snapshot`, qui le tient ensuite à jour
+(autres onglets, autres serveurs), en plus des mises à jour locales
+(create/delete). TreeCache garde un arbre vivant par utilisateur, en nombre
+borné : un arbre évincé ferme son listener.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+MAX_ARBRES = 256          # utilisateurs gardés en mémoire (un listener chacun)
+INACTIVITE = 30 * 60      # secondes sans accès avant de fermer un arbre
+ATTENTE_SNAPSHOT = 10.0   # délai max pour le premier instantané du listener
+
+
+def _parent(doc):
+    return doc.get("parent_id") or None  # "" et None = racine
+
+
+def _created(doc):
+    # Création locale pas encore confirmée (SERVER_TIMESTAMP) : considérée comme la plus récente
+    ts = doc.get("created_at")
+    return ts if isinstance(ts, datetime) else datetime.max.replace(tzinfo=timezone.utc)
+
+
+class SessionTree:
+    def __init__(self, docs=()):
+        self.by_id = {}
+        self._children = {}  # parent_id -> set(session_id)
+        self._lock = threading.RLock()
+        self._unsubscribe = None
+        for doc in docs:
+            self.add(doc)
+
+    @classmethod
+    def load(cls, db, username):
+        """Une seule requête pour tout l'arbre de l'utilisateur."""
+        docs = db.collection("sessions").where("username", "==", username).stream()
+        return cls(doc.to_dict() for doc in docs)
+
+    @classmethod
+    def live(cls, db, username, timeout=ATTENTE_SNAPSHOT):
+        """Arbre chargé par le premier instantané d'un listener on_snapshot, puis tenu à jour par lui.
+
+        Sans listener (ou s'il ne répond pas à temps), on retombe sur load() :
+        les mises à jour locales suffisent alors pour ce serveur.
+        """
+        tree = cls()
+        ready = threading.Event()
+
+        def on_snapshot(snapshot, changes, read_time):
+            tree._on_snapshot(snapshot, changes, read_time)
+            ready.set()
+
+        try:
+            watcher = db.collection("sessions").where("username", "==", username).on_snapshot(on_snapshot)
+        except Exception:
+            return cls.load(db, username)
+        tree._unsubscribe = watcher.unsubscribe
+        if not ready.wait(timeout):
+            tree.close()
+            return cls.load(db, username)
+        return tree
+
+    def _on_snapshot(self, snapshot, changes, read_time):
+        with self._lock:
+            for change in changes:
+                if change.type.name == "REMOVED":
+                    self.remove(change.document.id)
+                else:  # ADDED / MODIFIED
+                    self.add(change.document.to_dict())
+
+    def add(self, doc):
+        with self._lock:
+            sid = doc["session_id"]
+            old = self.by_id.get(sid)
+            if old is not None:
+                self._children.get(_parent(old), set()).discard(sid)
+            self.by_id[sid] = doc
+            self._children.setdefault(_parent(doc), set()).add(sid)
+
+    def update(self, session_id, **fields):
+        with self._lock:
+            if session_id in self.by_id:
+                self.add(dict(self.by_id[session_id], **fields))
+
+    def remove(self, session_id):
+        with self._lock:
+            doc = self.by_id.pop(session_id, None)
+            if doc is not None:
+                self._children.get(_parent(doc), set()).discard(session_id)
+
+    def get(self, session_id):
+        return self.by_id.get(session_id)
+
+    def __contains__(self, session_id):
+        return session_id in self.by_id
+
+    def _sorted(self, ids):
+        docs = [self.by_id[i] for i in ids if i in self.by_id]
+        return sorted(docs, key=_created, reverse=True)  # plus récents d'abord, comme avant
+
+    def roots(self):
+        with self._lock:
+            return self._sorted(self._children.get(None, ()))
+
+    def children(self, session_id):
+        with self._lock:
+            return self._sorted(self._children.get(session_id, ()))
+
+    def close(self):
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+
+
+class TreeCache:
+    """Arbres vivants par utilisateur, en LRU bornée avec expiration après inactivité.
+
+    `open_tree(username)` construit l'arbre (ex: SessionTree.live) ; un arbre
+    évincé ou expiré est fermé, donc son listener aussi.
+    """
+
+    def __init__(self, open_tree, max_entries=MAX_ARBRES, ttl=INACTIVITE, clock=time.monotonic):
+        self._open = open_tree
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._trees = OrderedDict()  # username -> (arbre, dernier accès)
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        """Sous le verrou : renvoie les arbres à fermer (expirés, puis en trop)."""
+        closed = [u for u, (_, used) in self._trees.items() if now - used > self.ttl]
+        closed = [self._trees.pop(u)[0] for u in closed]
+        while len(self._trees) > self.max_entries:
+            closed.append(self._trees.popitem(last=False)[1][0])
+        return closed
+
+    def get(self, username):
+        now = self._clock()
+        with self._lock:
+            entry = self._trees.get(username)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._trees[username] = (entry[0], now)
+                self._trees.move_to_end(username)
+                return entry[0]
+        tree = self._open(username)  # hors du verrou : les autres utilisateurs n'attendent pas la lecture
+        with self._lock:
+            entry = self._trees.get(username)
+            if entry is not None and now - entry[1] <= self.ttl:
+                closed, tree = [tree], entry[0]  # ouvert entre-temps par un autre onglet : on garde le sien
+            else:
+                closed = [entry[0]] if entry is not None else []  # expiré
+            self._trees[username] = (tree, now)
+            self._trees.move_to_end(username)
+            closed += self._evict(now)
+        for old in closed:
+            old.close()
+        return tree
+
+    def __len__(self):
+        return len(self._trees)
+
+    def close(self):
+        with self._lock:
+            trees = [tree for tree, _ in self._trees.values()]
+            self._trees.clear()
+        for tree in trees:
+            tree.close()
@@ -0,0 +1,159 @@
+"""Temps de démarrage à froid de Super Prof, mesuré avec `python -X importtime`.
+
+Chaque scénario tourne dans un interpréteur neuf (comme un conteneur qui
+démarre) : le "login" importe exactement ce que interface.py importe avant
+sa barrière de connexion (le premier `st.stop()`), c'est-à-dire ce que paie
+l'écran de connexion. Les dépendances lourdes (Gemini, Firestore, gRPC,
+NumPy, PyPDF2) sont mesurées à part : elles doivent rester HORS du chemin du
+login, sinon le script sort en erreur.
+
+    python startup_bench.py
+    python startup_bench.py --json demarrage.json
+    python startup_bench.py --baseline demarrage.json
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import time
+
+ICI = os.path.dirname(os.path.abspath(__file__))
+
+# Chargés au premier besoin réel (model_registry, get_db, airbag après le login, pdf_index, pdf_cache.iter_pages)
+SDK_DIFFERES = ("google.generativeai", "google.cloud.firestore", "google.oauth2.service_account", "grpc",
+                "numpy", "PyPDF2")
+
+
+def _login_gate(node):
+    """`if ...: ... st.stop()` de niveau module : la suite du script n'est pas exécutée avant le login."""
+    return isinstance(node, ast.If) and any(
+        isinstance(n, ast.Call) and isinstance(n.func, ast.Attribute) and n.func.attr == "stop"
+        for n in ast.walk(node))
+
+
+def imports_of(path):
+    """Modules importés au niveau module d'un fichier avant sa barrière de login (dans l'ordre)."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            names.append(node.module)
+        elif _login_gate(node):
+            break
+    return list(dict.fromkeys(names))
+
+
+def parse_importtime(stderr):
+    """{module: (self µs, cumulé µs)} pour tous les modules, et la liste des modules de 1er niveau."""
+    modules, top = {}, []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # en-tête "self [us] | cumulative | imported package"
+        name = parts[2].rstrip()
+        indent = len(name) - len(name.lstrip())
+        name = name.strip()
+        modules[name] = (int(parts[0]), int(parts[1]))
+        if indent == 1:
+            top.append(name)
+    return modules, top
+
+
+def measure(modules, runs=3, startup=()):
+    """Importe `modules` dans un interpréteur neuf ; garde le meilleur de `runs` essais.
+
+    `startup` : modules déjà chargés par l'interpréteur seul (site, encodings...), exclus du classement.
+    """
+    code = "import sys\nmissing = []\n" + "".join(
+        f"try:\n    import {m}\nexcept Exception:\n    missing.append({m!r})\n" for m in modules)
+    code += "import json\nprint(json.dumps({'missing': missing, 'loaded': sorted(sys.modules)}))\n"
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                              cwd=ICI, capture_output=True, text=True)
+        wall = time.perf_counter() - start
+        times, top = parse_importtime(proc.stderr)
+        state = json.loads(proc.stdout.strip().splitlines()[-1])
+        top = [m for m in top if m not in startup and m != "json"]  # json : import de la sonde elle-même
+        result = {
+            "wall_ms": round(wall * 1000, 1),
+            "import_ms": round(sum(times[m][1] for m in top) / 1000, 1),
+            "top": sorted(((m, round(times[m][1] / 1000, 1)) for m in top), key=lambda t: -t[1]),
+            "loaded": state["loaded"],
+            "missing": state["missing"],
+        }
+        if best is None or result["wall_ms"] < best["wall_ms"]:
+            best = result
+    return best
+
+
+def run(args):
+    interpreteur = measure([], args.runs)
+    startup = set(interpreteur["loaded"])
+    login = measure(imports_of(os.path.join(ICI, "interface.py")), args.runs, startup)
+    fuites = [m for m in SDK_DIFFERES if m in login["loaded"]]
+    sdks = {}
+    for m in SDK_DIFFERES:
+        r = measure([m], args.runs, startup)
+        sdks[m] = None if r["missing"] else r["import_ms"]
+    return {
+        "python": sys.version.split()[0],
+        "interpreteur_ms": interpreteur["wall_ms"],
+        "login": {k: login[k] for k in ("wall_ms", "import_ms", "missing")},
+        "top": login["top"][:args.top],
+        "sdk_differes_ms": sdks,
+        "fuites": fuites,
+    }
+
+
+def print_report(report, baseline=None):
+    login = report["login"]
+    line = f"Login (imports de interface.py) : {login['import_ms']:.1f} ms d'imports, {login['wall_ms']:.1f} ms au total"
+    if baseline:
+        delta = login["wall_ms"] - baseline["login"]["wall_ms"]
+        line += f"   ({delta:+.1f} ms vs référence)"
+    print(line)
+    print(f"Interpréteur seul               : {report['interpreteur_ms']:.1f} ms")
+    if login["missing"]:
+        print(f"Non installés ici               : {', '.join(login['missing'])}")
+    print(f"\n{'module (1er niveau)':<36}{'cumulé ms':>10}")
+    for name, ms in report["top"]:
+        print(f"{name:<36}{ms:>10.1f}")
+    print(f"\n{'SDK différé':<36}{'import ms':>10}")
+    for name, ms in report["sdk_differes_ms"].items():
+        etat = "non installé" if ms is None else f"{ms:.1f}"
+        statut = "  <- CHARGÉ AU LOGIN" if name in report["fuites"] else ""
+        print(f"{name:<36}{etat:>10}{statut}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="essais par scénario (on garde le meilleur)")
+    parser.add_argument("--top", type=int, default=15, help="modules les plus lents affichés")
+    parser.add_argument("--json", help="écrit le rapport dans ce fichier")
+    parser.add_argument("--baseline", help="rapport JSON précédent à comparer")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    report = run(args)
+    print_report(report, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if report["fuites"]:
+        sys.exit(f"\nSDK importés sur le chemin du login : {', '.join(report['fuites'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Accès Firestore de l'historique du chat, sans dépendance à Streamlit.
+
+interface.py garde ses fonctions (`save_msg`, `load_messages`) mais délègue
+ici : on peut ainsi les appeler hors d'un script Streamlit (benchmarks,
+tâches de fond) avec n'importe quel `db` compatible Firestore.
+"""
+import metrics
+
+
+def message_doc(session_id, username, role, content):
+    """Document `chat_history` (l'horodatage est posé par le WriteBuffer)."""
+    return {"session_id": session_id, "username": username, "role": role, "content": content}
+
+
+@metrics.timed("firestore", "load_messages")
+def load_messages(db, session_id, limit=50, before=None):
+    """Les `limit` derniers messages (avant le curseur `before`), du plus ancien au plus récent."""
+    q = db.collection("chat_history").where("session_id", "==", session_id).order_by("timestamp", direction="DESCENDING")
+    if before is not None:
+        q = q.start_after({"timestamp": before})
+    docs = [doc.to_dict() for doc in q.limit(limit).stream()]
+    docs.reverse()
+    return docs
+
+
+# --- PLAN DU MANAGER (stocké sur le document de la session) ---
+def outline(plan, max_items=12, width=80):
+    """Sommaire compact du plan : ses lignes numérotées / titres, raccourcies."""
+    items = []
+    for line in (plan or "").splitlines():
+        line = line.strip().lstrip("#*- ").strip()
+        if not line or not (line[0].isdigit() or line.lower().startswith(("étape", "partie", "module"))):
+            continue
+        items.append(line if len(line) <= width else line[:width - 1] + "…")
+        if len(items) == max_items:
+            break
+    return items
+
+
+def plan_fields(plan, pdf_hash=None, objectif=None):
+    # L'objectif permet de refaire le plan plus tard (autre PDF) sans le redemander
+    return {"plan": plan, "outline": outline(plan), "pdf_hash": pdf_hash, "objectif": objectif}
+
+
+@metrics.timed("firestore", "save_plan")
+def save_plan(db, session_id, plan, pdf_hash=None, objectif=None):
+    """Écrit plan + sommaire + hash du PDF (+ objectif) sur la session ; renvoie les champs écrits."""
+    fields = plan_fields(plan, pdf_hash, objectif)
+    db.collection("sessions").document(session_id).update(fields)
+    return fields
+
+
+def plan_of(tree, session_id):
+    """Plan de la session, ou à défaut celui de l'ancêtre le plus proche (les sous-dossiers en héritent).
+
+    Renvoie le document qui porte le plan, ou None. Aucune lecture : tout vient de l'arbre.
+    """
+    seen = set()
+    doc = tree.get(session_id)
+    while doc is not None and doc["session_id"] not in seen:
+        if doc.get("plan"):
+            return doc
+        seen.add(doc["session_id"])
+        doc = tree.get(doc.get("parent_id")) if doc.get("parent_id") else None
+    return None
+
+
+def plan_matches_pdf(doc, pdf_hash):
+    """Le plan porté par `doc` a-t-il été fait pour ce PDF ? Sans PDF chargé, rien à contester."""
+    return pdf_hash is None or doc.get("pdf_hash") == pdf_hash
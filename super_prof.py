@@ -1,89 +1,93 @@
-import google.generativeai as genai
-import time
-from google.api_core.exceptions import ResourceExhausted
-
-# --- FONCTION DE SÉCURITÉ (L'AIRBAG) ---
-def generate_safe(model, prompt, is_chat=False, chat_session=None):
-    """Essaie de générer une réponse. Si ça bloque, attend et réessaie."""
-    try:
-        if is_chat:
-            return chat_session.send_message(prompt).text
-        else:
-            return model.generate_content(prompt).text
-    except ResourceExhausted:
-        # C'est ici que l'Airbag se déclenche !
-        time.sleep(15) # On fait une pause de 15 secondes
-        # On réessaie une dernière fois
-        if is_chat:
-            return chat_session.send_message(prompt).text
-        else:
-            return model.generate_content(prompt).text
+"""Les fonctions des agents, telles que l'interface et le benchmark les appellent.
+
+Les prompts, modèles, budgets et caches sont déclarés dans agents.py ; ici il
+ne reste que les signatures historiques, branchées sur le moteur unique.
+`stream=None` laisse le registre décider (Professeur, Examinateur et Coach
+streament) ; `fallback` (ex: agents.MSG_SURCHARGE) remplace l'exception de
+quota par un texte à afficher.
+"""
+import agents
+import async_runtime
 
 # --- 1. LE MANAGER ---
-def get_manager_plan(api_key, user_goal, pdf_text=""):
-    genai.configure(api_key=api_key)
-    system_prompt = """
-    Tu es le Manager Pédagogique.
-    TON RÔLE :
-    1. Analyse l'objectif et le PDF.
-    2. Découpe l'apprentissage en étapes numérotées.
-    3. Reste synthétique. Ne donne pas le cours, fais le sommaire.
-    """
-    # Remets ici le modèle que tu veux (ex: gemini-2.5-flash ou 1.5-flash)
-    model = genai.GenerativeModel("models/gemini-1.5-flash", system_instruction=system_prompt)
-    prompt = f"Objectif : {user_goal}\n\nContexte PDF : {pdf_text[:10000]}..." 
-    
-    # Appel sécurisé
-    return generate_safe(model, prompt)
+def get_manager_plan(api_key, user_goal, pdf_text="", fallback=None):
+    # Même objectif + même PDF = même plan (cache exact)
+    return agents.run("manager", api_key, objectif=user_goal, pdf=pdf_text, fallback=fallback)
 
 # --- 2. LE PROFESSEUR ---
-def get_professor_response(api_key, history, current_question, plan):
-    genai.configure(api_key=api_key)
-    system_prompt = f"""
-    Tu es un Professeur Expert.
-    Ton guide est ce plan : {plan}
-    Explique clairement, étape par étape. Sois pédagogue et patient.
-    """
-    model = genai.GenerativeModel("models/gemini-1.5-flash", system_instruction=system_prompt)
-    chat = model.start_chat(history=history)
-    
-    # Appel sécurisé
-    return generate_safe(model, current_question, is_chat=True, chat_session=chat)
+def get_professor_response(api_key, history, current_question, plan, stream=None, pdf_index=None, pdf_text="", pdf_hash=None,
+                           dedup=False, fallback=None):
+    """dedup=True : questions quasi identiques sur le même plan servies par semantic_cache (opt-in)."""
+    # history peut être une Conversation : la ChatSession est alors réutilisée d'un tour à l'autre
+    return agents.run("professeur", api_key, history, stream=stream, fallback=fallback, dedup=dedup,
+                      pdf_index=pdf_index, pdf_text=pdf_text, pdf_hash=pdf_hash, plan=plan, question=current_question)
 
 # --- 3. LE SCRIBE ---
-def get_scribe_summary(api_key, history, mode="fiche"):
-    genai.configure(api_key=api_key)
-    
-    if mode == "fusion":
-        instruction = "Tu es le Scribe. Résume ce sous-module pour le dossier parent."
-    else:
-        instruction = "Tu es le Scribe. Fais une Fiche de Révision claire (Markdown)."
-
-    model = genai.GenerativeModel("models/gemini-1.5-flash", system_instruction=instruction)
-    chat = model.start_chat(history=history)
-    
-    return generate_safe(model, "Fais le travail demandé.", is_chat=True, chat_session=chat)
+def get_scribe_summary(api_key, history, mode="fiche", stream=None, fallback=None):
+    return agents.run("scribe-fusion" if mode == "fusion" else "scribe-fiche", api_key, history,
+                      stream=stream, fallback=fallback)
 
 # --- 4. L'EXAMINATEUR ---
-def get_examiner_quiz(api_key, history):
-    genai.configure(api_key=api_key)
-    system_prompt = """
-    Tu es l'Examinateur.
-    Pose 3 questions pièges sur la conversation actuelle.
-    """
-    model = genai.GenerativeModel("models/gemini-1.5-flash", system_instruction=system_prompt)
-    chat = model.start_chat(history=history)
-    
-    return generate_safe(model, "Teste l'étudiant maintenant.", is_chat=True, chat_session=chat)
+def get_examiner_quiz(api_key, history, stream=None, pdf_index=None, fallback=None):
+    return agents.run("examinateur", api_key, history, stream=stream, fallback=fallback, pdf_index=pdf_index)
 
 # --- 5. LE COACH ---
-def get_coach_advice(api_key, history):
-    genai.configure(api_key=api_key)
-    system_prompt = """
-    Tu es le Coach Mental.
-    Donne un conseil de méthodologie et une phrase de motivation.
+def get_coach_advice(api_key, history, stream=None, fallback=None):
+    return agents.run("coach", api_key, history, stream=stream, fallback=fallback)
+
+# --- 6. LA REVUE COMPLÈTE (Examinateur + Coach + Scribe en parallèle) ---
+REVUE = [
+    ("😈 EXAMINATEUR", "examinateur", {}),
+    ("📣 COACH", "coach", {}),
+    ("📝 SCRIBE", "scribe-fiche", {}),
+]
+
+def get_full_review(api_key, history, pdf_index=None, fallback=None):
+    """Lance les trois spécialistes en même temps : le temps d'un agent au lieu de trois.
+
+    Renvoie [(titre, texte)] dans un ordre fixe. Un agent en échec n'empêche
+    pas les autres de répondre.
     """
-    model = genai.GenerativeModel("models/gemini-1.5-flash", system_instruction=system_prompt)
-    chat = model.start_chat(history=history)
-    
-    return generate_safe(model, "Donne-moi un conseil.", is_chat=True, chat_session=chat)
+    return agents.run_many(api_key, REVUE, history, fallback=fallback, pdf_index=pdf_index)
+
+
+# =========================================================
+# ⚡ VERSION ASYNCHRONE (mêmes agents, même moteur)
+# =========================================================
+# Tout tourne sur la boucle partagée d'async_runtime, même appelé depuis une
+# autre boucle (ex: asyncio.run) : un seul client Gemini asynchrone pour le
+# process, au plus async_runtime.MAX_CONCURRENT appels à la fois, et annulation
+# par session (cancel_session) quand l'étudiant s'en va.
+
+async def get_manager_plan_async(api_key, user_goal, pdf_text="", session_id=None):
+    return await async_runtime.on_loop(agents.run_async("manager", api_key, objectif=user_goal, pdf=pdf_text),
+                                       session_id)
+
+async def get_professor_response_async(api_key, history, current_question, plan, stream=False, pdf_index=None,
+                                       pdf_text="", pdf_hash=None, session_id=None):
+    """Comme get_professor_response ; avec stream=True, renvoie un générateur asynchrone."""
+    response = await async_runtime.on_loop(
+        agents.run_async("professeur", api_key, history, stream=stream, pdf_index=pdf_index,
+                         pdf_text=pdf_text, pdf_hash=pdf_hash, plan=plan, question=current_question),
+        session_id)
+    return async_runtime.iterate_on_loop(response, session_id) if stream else response
+
+async def get_scribe_summary_async(api_key, history, mode="fiche", session_id=None):
+    return await async_runtime.on_loop(
+        agents.run_async("scribe-fusion" if mode == "fusion" else "scribe-fiche", api_key, history, stream=False),
+        session_id)
+
+async def get_examiner_quiz_async(api_key, history, pdf_index=None, session_id=None):
+    return await async_runtime.on_loop(
+        agents.run_async("examinateur", api_key, history, stream=False, pdf_index=pdf_index), session_id)
+
+async def get_coach_advice_async(api_key, history, session_id=None):
+    return await async_runtime.on_loop(agents.run_async("coach", api_key, history, stream=False), session_id)
+
+def submit_agent(coro, session_id=None):
+    """Lance un agent asynchrone depuis du code synchrone (ex: Streamlit) ; renvoie un Future."""
+    return async_runtime.submit(coro, group=session_id)
+
+def cancel_session(session_id):
+    """L'étudiant a quitté la session : on annule ses appels encore en vol (lancés avec ce session_id)."""
+    return async_runtime.cancel_group(session_id)
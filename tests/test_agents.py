@@ -0,0 +1,81 @@
+"""Le moteur d'agents contre le faux Gemini de fakes.py : ce qui part vraiment à chaque tour."""
+import pytest
+
+pytest.importorskip("google.api_core")
+pytest.importorskip("numpy")
+
+import agents
+import context_cache
+import model_registry
+import response_cache
+import semantic_cache
+from conversation import Conversation
+from fakes import FakeContextBackend, FakeGemini
+from model_registry import ModelRegistry
+from pdf_index import build_index
+
+CLE = "cle-de-test"
+PLAN = "1. Dérivées 2. Primitives"
+PAGES = [f"La dérivée d'une fonction composée se calcule avec la règle de la chaîne. Page {i}. " * 20
+         for i in range(8)]
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    backend = FakeGemini(latency=0, response_chars=200, sleep=lambda s: None)
+    monkeypatch.setattr(model_registry, "registry", ModelRegistry(factory=backend.model, configure=backend.configure))
+    monkeypatch.setattr(response_cache, "cache", response_cache.ResponseCache())
+    monkeypatch.setattr(semantic_cache, "cache", semantic_cache.SemanticCache())
+    monkeypatch.setattr(context_cache, "cache", context_cache.ContextCache(backend=FakeContextBackend(backend)))
+    return backend
+
+
+def tour(conv, question, **options):
+    reponse = agents.run("professeur", CLE, conv, stream=False, plan=PLAN, question=question, **options)
+    conv.append("user", question)
+    conv.append("assistant", reponse)
+    return reponse
+
+
+def test_les_extraits_ne_restent_pas_dans_la_chat_session(gemini):
+    conv = Conversation("s1")
+    index = build_index(PAGES)
+    for i in range(6):
+        tour(conv, f"Question {i} sur la dérivée d'une fonction composée ?", pdf_index=index)
+    chat = next(iter(conv._chats.values()))[1]
+    envoye = " ".join(str(p) for t in chat.history for p in t["parts"])
+    assert "Extraits pertinents" not in envoye
+    assert chat.history == conv.history
+
+
+def test_le_brouillon_semantique_ne_reste_pas_non_plus(gemini):
+    conv = Conversation("s1")
+    agents.run("professeur", CLE, [], stream=False, dedup=True, plan=PLAN,
+               question="Comment calculer la dérivée d'un produit de fonctions ?")
+    tour(conv, "Comment calculer la dérivée d'un produit ?", dedup=True)
+    chat = next(iter(conv._chats.values()))[1]
+    assert chat.history[0] == {"role": "user", "parts": ["Comment calculer la dérivée d'un produit ?"]}
+
+
+def test_le_budget_est_tenu_avant_l_envoi(gemini):
+    # Ex: "Charger plus ancien" vient d'ajouter 50 vieux messages, pas encore résumés
+    conv = Conversation("s1")
+    conv.prepend([{"role": "user" if i % 2 == 0 else "assistant", "content": "bla " * 400} for i in range(50)])
+    tour(conv, "Et la suite ?")
+    budget = agents.AGENTS["professeur"].budget
+    assert gemini.stats["prompt_tokens"] <= budget + 100  # + system prompt et question
+    assert gemini.stats["calls"] == 1
+
+
+def test_second_clic_sur_un_specialiste_sort_du_cache(gemini):
+    conv = Conversation("s1")
+    tour(conv, "C'est quoi une dérivée ?")
+    quiz = agents.run("examinateur", CLE, conv, stream=False)
+    conv.append("assistant", agents.signed("quiz", quiz))  # comme l'interface
+    appels = gemini.stats["calls"]
+    assert agents.run("examinateur", CLE, conv, stream=False) == quiz
+    assert gemini.stats["calls"] == appels
+    # Une vraie nouvelle question change la clé
+    tour(conv, "Et une primitive ?")
+    agents.run("examinateur", CLE, conv, stream=False)
+    assert gemini.stats["calls"] == appels + 2
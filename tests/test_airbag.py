@@ -0,0 +1,149 @@
+"""L'airbag rejoué contre un faux modèle qui lève des 429 sur un planning.
+
+Horloge, sommeil et hasard sont injectés : aucune vraie attente, délais exacts.
+"""
+import pytest
+
+pytest.importorskip("google.api_core")
+
+from google.api_core.exceptions import ResourceExhausted
+
+import airbag
+from airbag import RetryBudget, RetryPolicy, Surcharge, TokenBucket, call_with_retry
+
+
+class Clock:
+    """Horloge virtuelle : sleep() avance le temps et garde la trace des attentes."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class Scheduled:
+    """Faux modèle : le planning dit, appel par appel, s'il répond ou lève."""
+
+    def __init__(self, *schedule):
+        self.schedule = list(schedule)
+        self.calls = 0
+
+    def __call__(self):
+        outcome = self.schedule[min(self.calls, len(self.schedule) - 1)]
+        self.calls += 1
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def quota():
+    return ResourceExhausted("429")
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def call(fn, clock, **kwargs):
+    kwargs.setdefault("policy", RetryPolicy(max_attempts=4, base_delay=1.0, max_delay=20.0, deadline=45.0))
+    kwargs.setdefault("budget", None)
+    return call_with_retry(fn, sleep=clock.sleep, clock=clock, rng=lambda: 1.0, **kwargs)
+
+
+def test_backoff_exponentiel_puis_succes(clock):
+    fn = Scheduled(quota(), quota(), quota(), "ok")
+    retries = []
+    assert call(fn, clock, on_retry=lambda n, e, d: retries.append((n, d))) == "ok"
+    assert fn.calls == 4
+    assert clock.sleeps == [1.0, 2.0, 4.0]
+    assert retries == [(1, 1.0), (2, 2.0), (3, 4.0)]
+
+
+def test_jitter_et_plafond(clock):
+    policy = RetryPolicy(max_attempts=6, base_delay=1.0, max_delay=5.0, deadline=100.0)
+    fn = Scheduled(quota(), quota(), quota(), quota(), quota(), "ok")
+    call_with_retry(fn, policy=policy, budget=None, sleep=clock.sleep, clock=clock, rng=lambda: 0.5)
+    assert clock.sleeps == [0.5, 1.0, 2.0, 2.5, 2.5]
+
+
+def test_max_attempts_releve_l_erreur_de_google(clock):
+    fn = Scheduled(quota())
+    with pytest.raises(ResourceExhausted):
+        call(fn, clock)
+    assert fn.calls == 4
+    assert clock.sleeps == [1.0, 2.0, 4.0]
+
+
+def test_deadline_abandonne_avant_d_attendre(clock):
+    fn = Scheduled(quota())
+    with pytest.raises(ResourceExhausted):
+        call(fn, clock, policy=RetryPolicy(max_attempts=10, base_delay=1.0, deadline=2.5))
+    # 1er retry à t=1 ; le 2e (attente 2 s) finirait à t=3 > 2.5 : on renonce sans dormir
+    assert fn.calls == 2
+    assert clock.sleeps == [1.0]
+
+
+def test_budget_epuise_stoppe_les_retries(clock):
+    budget = RetryBudget(ratio=0.0, min_tokens=1)
+    fn = Scheduled(quota())
+    with pytest.raises(ResourceExhausted):
+        call(fn, clock, budget=budget)
+    assert fn.calls == 2  # un seul retry autorisé par le budget
+    with pytest.raises(ResourceExhausted):
+        call(Scheduled(quota()), clock, budget=budget)
+    assert not budget.withdraw()
+
+
+def test_erreur_non_reessayable_remonte_tout_de_suite(clock):
+    fn = Scheduled(ValueError("prompt invalide"), "ok")
+    with pytest.raises(ValueError):
+        call(fn, clock)
+    assert fn.calls == 1
+    assert clock.sleeps == []
+
+
+def test_limiteur_fait_patienter(clock):
+    bucket = TokenBucket(rate=1.0, capacity=1, clock=clock)
+    assert call(Scheduled("a"), clock, limiter=bucket) == "a"
+    assert call(Scheduled("b"), clock, limiter=bucket) == "b"
+    assert clock.sleeps == [1.0]
+
+
+def test_limiteur_leve_surcharge_sans_appeler(clock):
+    bucket = TokenBucket(rate=1 / 60, capacity=1, clock=clock)  # 1 requête par minute
+    call(Scheduled("a"), clock, limiter=bucket)
+    fn = Scheduled("b")
+    with pytest.raises(Surcharge):
+        call(fn, clock, limiter=bucket, policy=RetryPolicy(deadline=10.0))
+    assert fn.calls == 0
+    # Le jeton réservé a été rendu : une minute plus tard, ça repasse
+    clock.now += 60
+    assert call(Scheduled("c"), clock, limiter=bucket) == "c"
+
+
+def test_un_429_vide_le_seau(clock):
+    bucket = TokenBucket(rate=1.0, capacity=5, clock=clock)
+    call(Scheduled(quota(), "ok"), clock, limiter=bucket)
+    # drain() a vidé le seau (5 jetons) : le backoff de 1 s n'en a rendu qu'un, pris par le retry
+    assert clock.sleeps == [1.0]
+    assert bucket.reserve() > 0
+
+
+def test_surcharge_est_un_resource_exhausted():
+    assert issubclass(Surcharge, ResourceExhausted)
+    assert ResourceExhausted in airbag.RETRYABLE
+
+
+def test_quota_de_la_cle_reglable(monkeypatch):
+    monkeypatch.setattr(airbag, "_limiters", {})
+    assert airbag.get_limiter("cle").capacity == airbag.RPM_PAR_DEFAUT
+    paye = airbag.get_limiter("cle", rpm=1000)
+    assert paye.capacity == 1000 and paye.rate == pytest.approx(1000 / 60)
+    assert airbag.get_limiter("cle") is paye  # les agents récupèrent le limiteur réglé au démarrage
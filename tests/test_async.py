@@ -0,0 +1,64 @@
+"""API asynchrone de super_prof : boucle partagée, quelle que soit la boucle de l'appelant."""
+import asyncio
+
+import pytest
+
+pytest.importorskip("google.api_core")
+pytest.importorskip("numpy")
+
+import airbag
+import async_runtime
+import model_registry
+import response_cache
+import super_prof
+from fakes import FakeGemini
+from model_registry import ModelRegistry
+
+CLE = "cle-de-test"
+HISTORIQUE = [{"role": "user", "parts": ["C'est quoi une dérivée ?"]},
+              {"role": "model", "parts": ["Une pente."]}]
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    backend = FakeGemini(latency=0.01, response_chars=60)
+    monkeypatch.setattr(model_registry, "registry", ModelRegistry(factory=backend.model, configure=backend.configure))
+    monkeypatch.setattr(response_cache, "cache", response_cache.ResponseCache())
+    monkeypatch.setattr(airbag, "_limiters", {})
+    airbag.get_limiter(CLE, rpm=100000)  # on teste la boucle, pas le quota
+    return backend
+
+
+def test_asyncio_run_apres_la_boucle_partagee(gemini):
+    async def quarante():
+        # Plus que MAX_CONCURRENT : le sémaphore a des appels en attente
+        return await asyncio.gather(*[super_prof.get_coach_advice_async(CLE, HISTORIQUE) for _ in range(40)])
+
+    assert len(async_runtime.run(quarante())) == 40
+    assert len(asyncio.run(quarante())) == 40  # autre boucle, même sémaphore
+    assert gemini.stats["calls"] == 80
+
+
+def test_streaming_depuis_une_autre_boucle(gemini):
+    async def lire():
+        chunks = await super_prof.get_professor_response_async(CLE, HISTORIQUE, "Et une primitive ?", "Plan",
+                                                               stream=True)
+        return [c async for c in chunks]
+
+    assert "".join(asyncio.run(lire())).startswith("Réponse factice.")
+
+
+def test_cancel_session_annule_les_appels_en_vol(gemini):
+    gemini.latency = 5
+
+    async def appel():
+        return await super_prof.get_coach_advice_async(CLE, HISTORIQUE, session_id="s1")
+
+    async def quitter():
+        tache = asyncio.ensure_future(appel())
+        await asyncio.sleep(0.05)
+        assert super_prof.cancel_session("s1") == 1
+        with pytest.raises(asyncio.CancelledError):
+            await tache
+
+    asyncio.run(quitter())
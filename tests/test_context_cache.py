@@ -0,0 +1,87 @@
+"""Tenue de livres du cache de contexte contre FakeContextBackend : TTL, échecs, éviction."""
+import pytest
+
+pytest.importorskip("google.api_core")  # fakes.py lève les mêmes erreurs que Google
+
+import context_cache
+from context_cache import MARGE, ContextCache
+from fakes import FakeContextBackend, FakeGemini
+
+PLAN = "Tu es un Professeur Expert. Ton plan à suivre est : 1. Dérivées"
+PDF = "Le cours entier. " * 100
+
+
+class Horloge:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def horloge():
+    return Horloge()
+
+
+@pytest.fixture
+def backend():
+    backend = FakeContextBackend(FakeGemini(latency=0))
+    backend.attempts = 0
+    create = backend.create
+
+    def compte(*args):
+        backend.attempts += 1
+        return create(*args)
+
+    backend.create = compte
+    return backend
+
+
+def cache_de_test(backend, horloge, **options):
+    return ContextCache(backend=backend, ttl=3600, min_tokens=10, clock=horloge, **options)
+
+
+def test_trop_petit_pas_de_cache(backend, horloge):
+    cache = cache_de_test(backend, horloge)
+    assert cache.model_for("cle", "court") is None
+    assert backend.attempts == 0
+
+
+def test_reutilise_puis_renouvelle_avant_l_expiration(backend, horloge):
+    cache = cache_de_test(backend, horloge)
+    premier = cache.model_for("cle", PLAN, PDF, "sha")
+    horloge.now = 3600 - MARGE - 1
+    assert cache.model_for("cle", PLAN, PDF, "sha") is premier
+    assert (cache.created, cache.reused) == (1, 1)
+    horloge.now = 3600 - MARGE  # expire dans moins de MARGE : on n'envoie plus rien dessus
+    assert cache.model_for("cle", PLAN, PDF, "sha") is not premier
+    assert backend.attempts == 2 and cache.created == 2
+
+
+def test_un_echec_n_est_pas_retente_avant_le_ttl(backend, horloge):
+    backend.fail = True
+    cache = cache_de_test(backend, horloge)
+    assert cache.model_for("cle", PLAN, PDF, "sha") is None
+    horloge.now = 3599
+    assert cache.model_for("cle", PLAN, PDF, "sha") is None
+    assert backend.attempts == 1
+    backend.fail = False
+    horloge.now = 3601
+    assert cache.model_for("cle", PLAN, PDF, "sha") is not None
+    assert backend.attempts == 2
+
+
+def test_eviction_supprime_le_cache_cote_google(backend, horloge):
+    cache = cache_de_test(backend, horloge, max_entries=2)
+    for sha in ("a", "b", "c"):
+        cache.model_for("cle", PLAN, PDF, sha)
+    assert ContextCache.key(PLAN, "a") not in cache._handles
+    assert len(backend.deleted) == 1 and len(backend.caches) == 2
+    assert cache.stats()["handles"] == 2
+
+
+def test_module_utilise_le_cache_du_process(backend, horloge, monkeypatch):
+    monkeypatch.setattr(context_cache, "cache", cache_de_test(backend, horloge))
+    assert context_cache.model_for("cle", PLAN, PDF) is context_cache.model_for("cle", PLAN, PDF)
+    assert backend.attempts == 1
@@ -0,0 +1,12 @@
+"""Un seul percentile pour le panneau admin et le benchmark."""
+import metrics
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 21))  # 1..20, dans le désordre pour vérifier le tri
+    values.reverse()
+    assert metrics.percentile(values, 50) == 10
+    assert metrics.percentile(values, 95) == 19
+    assert metrics.percentile(values, 100) == 20
+    assert metrics.percentile(values, 0) == 1
+    assert metrics.percentile([], 95) == 0.0
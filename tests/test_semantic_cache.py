@@ -0,0 +1,56 @@
+"""Le cache sémantique ne doit resservir une réponse que pour la même question."""
+import pytest
+
+pytest.importorskip("numpy")
+
+import semantic_cache
+from semantic_cache import SemanticCache
+
+PERIMETRE = semantic_cache.scope_for("plan : les dérivées", "pdf")
+
+
+@pytest.fixture
+def cache():
+    return SemanticCache(clock=lambda: 0.0)
+
+
+def test_meme_question_reformulee_est_resservie(cache):
+    cache.add(PERIMETRE, "Comment calculer la dérivée d'un produit ?", "(uv)' = u'v + uv'")
+    match = cache.lookup(PERIMETRE, "comment calcule-t-on la dérivée d'un produit")
+    assert match is not None and match.reusable
+    assert match.answer == "(uv)' = u'v + uv'"
+
+
+def test_exposant_different_n_est_qu_un_brouillon(cache):
+    cache.add(PERIMETRE, "Quelle est la dérivée de x^2 ?", "2x")
+    match = cache.lookup(PERIMETRE, "Quelle est la dérivée de x^3 ?")
+    assert match is None or not match.reusable
+
+
+def test_nombres_differents_ne_sont_pas_resservis(cache):
+    cache.add(PERIMETRE, "Combien font 3 + 4 ?", "7")
+    match = cache.lookup(PERIMETRE, "Combien font 5 + 9 ?")
+    assert match is None or not match.reusable
+
+
+def test_symboles_identiques_mais_texte_proche(cache):
+    cache.add(PERIMETRE, "Quelle est la dérivée de x^2 ?", "2x")
+    assert cache.lookup(PERIMETRE, "quelle est la dérivée de x^2").reusable
+
+
+@pytest.mark.parametrize("question", [
+    "Et pour une fonction composée ?",
+    "Et si la fonction est composée ?",
+    "Pour une fonction composée ?",
+    "Aussi pour les fonctions composées ?",
+    "Tu peux refaire l'exemple précédent ?",
+])
+def test_question_qui_depend_du_tour_precedent(cache, question):
+    assert not semantic_cache.standalone(question)
+    cache.add(PERIMETRE, question, "réponse")
+    assert cache.lookup(PERIMETRE, question) is None
+
+
+def test_nombres_variables_et_operateurs_comptent():
+    assert semantic_cache.symbols("Quelle est la dérivée de x^2 ?") == {"x", "^", "2"}
+    assert semantic_cache.symbols("Qu'est-ce qu'une fonction composée ?") == frozenset()
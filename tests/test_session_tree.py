@@ -0,0 +1,69 @@
+"""Arbre des sessions : une seule lecture, et des listeners fermés quand l'arbre sort du cache."""
+import pytest
+
+pytest.importorskip("google.api_core")  # fakes.py lève les mêmes erreurs que Google
+
+from fakes import FakeFirestore
+from session_tree import SessionTree, TreeCache
+
+
+@pytest.fixture
+def db():
+    db = FakeFirestore()
+    for sid, parent in (("a", None), ("a1", "a"), ("b", None)):
+        db.collection("sessions").document(sid).set({"session_id": sid, "username": "alice", "parent_id": parent,
+                                                     "title": sid})
+    db.collection("sessions").document("z").set({"session_id": "z", "username": "bob", "title": "z"})
+    db.stats.clear()
+    return db
+
+
+def test_live_charge_l_arbre_en_une_lecture(db):
+    tree = SessionTree.live(db, "alice")
+    assert {d["session_id"] for d in tree.roots()} == {"a", "b"}
+    assert [d["session_id"] for d in tree.children("a")] == ["a1"]
+    assert db.stats["round_trips"] == 1
+
+
+def test_live_sans_listener_retombe_sur_load(db, monkeypatch):
+    def refuse(self, callback):
+        raise RuntimeError("pas de listener")
+    monkeypatch.setattr(type(db.collection("sessions").where("username", "==", "alice")), "on_snapshot", refuse)
+    assert "a1" in SessionTree.live(db, "alice")
+
+
+class Horloge:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def ouvert(journal):
+    def open_tree(username):
+        tree = SessionTree()
+        tree._unsubscribe = lambda: journal.append(username)  # ce que ferait le listener
+        return tree
+    return open_tree
+
+
+def test_le_cache_est_borne_et_ferme_les_evinces():
+    fermes = []
+    cache = TreeCache(ouvert(fermes), max_entries=2, clock=Horloge())
+    alice = cache.get("alice")
+    cache.get("bob")
+    assert cache.get("alice") is alice  # servi par le cache
+    cache.get("carol")  # bob est le moins récemment utilisé
+    assert fermes == ["bob"] and len(cache) == 2
+
+
+def test_un_arbre_inactif_est_ferme_et_rouvert():
+    fermes, horloge = [], Horloge()
+    cache = TreeCache(ouvert(fermes), ttl=60, clock=horloge)
+    alice = cache.get("alice")
+    horloge.now = 61
+    assert cache.get("alice") is not alice
+    assert fermes == ["alice"]
+    cache.close()
+    assert fermes == ["alice", "alice"]
@@ -0,0 +1,36 @@
+"""Plan du Manager stocké sur la session : héritage et PDF d'origine."""
+import pytest
+
+pytest.importorskip("google.api_core")  # fakes.py lève les mêmes erreurs que Google
+
+import storage
+from fakes import FakeFirestore
+from session_tree import SessionTree
+
+
+def arbre():
+    return SessionTree([
+        {"session_id": "racine", "title": "Analyse", "parent_id": None, **storage.plan_fields("1. Dérivées", "sha-a", "Réviser")},
+        {"session_id": "enfant", "title": "Exercices", "parent_id": "racine"},
+    ])
+
+
+def test_le_sous_dossier_herite_du_plan():
+    assert storage.plan_of(arbre(), "enfant")["session_id"] == "racine"
+
+
+def test_plan_et_pdf():
+    porteur = storage.plan_of(arbre(), "enfant")
+    assert storage.plan_matches_pdf(porteur, "sha-a")
+    assert storage.plan_matches_pdf(porteur, None)  # PDF pas rechargé : rien à contester
+    assert not storage.plan_matches_pdf(porteur, "sha-b")
+    assert not storage.plan_matches_pdf({"plan": "1. Dérivées", "pdf_hash": None}, "sha-a")
+
+
+def test_save_plan_ecrit_les_champs_sur_la_session():
+    db = FakeFirestore()
+    db.collection("sessions").document("racine").set({"session_id": "racine", "title": "Analyse"})
+    fields = storage.save_plan(db, "racine", "1. Dérivées\n2. Primitives", "sha-a", "Réviser l'analyse")
+    doc = db.collection("sessions").document("racine").get().to_dict()
+    assert doc["pdf_hash"] == "sha-a" and doc["objectif"] == "Réviser l'analyse"
+    assert fields["outline"] == ["1. Dérivées", "2. Primitives"]
@@ -0,0 +1,70 @@
+"""Le tampon d'écriture contre le faux Firestore : ordre, déclencheurs du flush, reprise après échec."""
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("google.api_core")  # fakes.py lève les mêmes erreurs que Google
+
+import fakes
+import storage
+from fakes import FakeFirestore
+from write_buffer import WriteBuffer
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def message(i):
+    return storage.message_doc("s1", "alice", "user" if i % 2 == 0 else "assistant", f"message {i}")
+
+
+def test_ordre_garanti_meme_avec_une_horloge_figee():
+    db = FakeFirestore()
+    buffer = WriteBuffer(db, max_size=100, interval=0, now=lambda: T0)
+    for i in range(10):
+        buffer.add(message(i))
+    buffer.flush()
+    assert [m["content"] for m in storage.load_messages(db, "s1")] == [f"message {i}" for i in range(10)]
+
+
+def test_flush_quand_le_tampon_est_plein():
+    db = FakeFirestore()
+    buffer = WriteBuffer(db, max_size=5, interval=0)
+    for i in range(4):
+        buffer.add(message(i))
+    assert db.stats["round_trips"] == 0 and len(buffer) == 4
+    buffer.add(message(4))
+    assert db.stats["round_trips"] == 1 and db.stats["writes"] == 5
+    assert len(buffer) == 0
+
+
+def test_flush_apres_l_intervalle():
+    db = FakeFirestore()
+    parti = threading.Event()
+    buffer = WriteBuffer(db, max_size=100, interval=0.01)
+    flush = buffer.flush
+    buffer.flush = lambda: (flush(), parti.set())
+    buffer.add(message(0))
+    buffer.add(message(1))
+    assert parti.wait(2)
+    assert db.stats["round_trips"] == 1 and db.stats["writes"] == 2
+
+
+def test_un_commit_rate_remet_les_messages_en_tete(monkeypatch):
+    db = FakeFirestore()
+    buffer = WriteBuffer(db, max_size=100, interval=0)
+    for i in range(3):
+        buffer.add(message(i))
+    commit = fakes.FakeBatch.commit
+
+    def en_panne(self):
+        raise ConnectionError("réseau")
+
+    monkeypatch.setattr(fakes.FakeBatch, "commit", en_panne)
+    with pytest.raises(ConnectionError):
+        buffer.flush()
+    assert len(buffer) == 3
+    buffer.add(message(3))  # arrivé pendant la panne : passe après les anciens
+    monkeypatch.setattr(fakes.FakeBatch, "commit", commit)
+    assert buffer.flush() == 4
+    assert [m["content"] for m in storage.load_messages(db, "s1")] == [f"message {i}" for i in range(4)]
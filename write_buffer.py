@@ -0,0 +1,79 @@
+"""Écritures Firestore groupées ("write-behind") pour l'historique du chat.
+
+Les messages s'accumulent dans un tampon et partent en un seul `WriteBatch` :
+quand le tampon est plein, après `interval` secondes, ou sur demande
+(changement de session, fusion, lecture).
+
+L'ordre est garanti par un horodatage client strictement croissant (dans un
+même batch, SERVER_TIMESTAMP donnerait la même valeur à tous les messages).
+Seuls `db.batch()`, `db.collection(...).document()`, `batch.set()` et
+`batch.commit()` sont utilisés : l'émulateur Firestore ou un faux en mémoire
+suffisent pour les tests.
+"""
+import threading
+from datetime import datetime, timedelta, timezone
+
+import metrics
+
+FIRESTORE_BATCH_MAX = 500  # limite d'opérations par batch côté Firestore
+
+
+class WriteBuffer:
+    def __init__(self, db, collection="chat_history", max_size=20, interval=2.0, now=None):
+        self.db = db
+        self.collection = collection
+        self.max_size = min(max_size, FIRESTORE_BATCH_MAX)
+        self.interval = interval
+        self._now = now or (lambda: datetime.now(timezone.utc))
+        self._pending = []
+        self._last_ts = None
+        self._timer = None
+        self._lock = threading.RLock()
+
+    def _next_timestamp(self):
+        ts = self._now()
+        if self._last_ts is not None and ts <= self._last_ts:
+            ts = self._last_ts + timedelta(microseconds=1)
+        self._last_ts = ts
+        return ts
+
+    def add(self, data):
+        """Met un document en attente ; renvoie une copie avec son horodatage."""
+        with self._lock:
+            doc = dict(data, timestamp=self._next_timestamp())
+            self._pending.append(doc)
+            if len(self._pending) >= self.max_size:
+                self.flush()
+            elif self.interval and self._timer is None:
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+            return doc
+
+    def flush(self):
+        """Envoie tout ce qui attend, en batches de FIRESTORE_BATCH_MAX. Renvoie le nombre écrit."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending, self._pending = self._pending, []
+            if not pending:
+                return 0
+            written = 0
+            try:
+                with metrics.track("firestore", "write_batch"):
+                    for start in range(0, len(pending), FIRESTORE_BATCH_MAX):
+                        batch = self.db.batch()
+                        col = self.db.collection(self.collection)
+                        for doc in pending[start:start + FIRESTORE_BATCH_MAX]:
+                            batch.set(col.document(), doc)
+                        batch.commit()
+                        written = start + FIRESTORE_BATCH_MAX
+            except Exception:
+                # Rien n'est perdu : ce qui n'est pas parti repasse en tête de file
+                self._pending = pending[written:] + self._pending
+                raise
+            return len(pending)
+
+    def __len__(self):
+        return len(self._pending)